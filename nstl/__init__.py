@@ -4,7 +4,8 @@ This package contains all the modules and subpackages forming the compiler
 of the nstl domain specific language.
 """
 
-__all__ = ['lex', 'parse', 'ast', 'sema', 'codegen']
+__all__ = ['lex', 'parse', 'ast', 'sema', 'codegen', 'stats', 'serialize',
+           'interface']
 
 
 if __name__ == "__main__":
@@ -30,6 +30,63 @@ class AttributeBucket(OrderedDict):
 
 
 
+class Lazy(object):
+    """A value computed by calling a function the first time it is needed.
+    """
+    __slots__ = ('compute',)
+    
+    def __init__(self, compute):
+        self.compute = compute
+
+
+
+class LazyBucket(AttributeBucket):
+    """An AttributeBucket replacing the Lazy values it holds by their
+    computed value the first time they are accessed.
+    """
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if isinstance(value, Lazy):
+            value = self[key] = value.compute()
+        return value
+    
+    
+    def when_computed(self, key, func):
+        """Call func with the value of a key once it is computed, which is
+        right away if it already is.
+        """
+        value = super().__getitem__(key)
+        if not isinstance(value, Lazy):
+            func(value)
+            return
+        def compute():
+            result = value.compute()
+            func(result)
+            return result
+        self[key] = Lazy(compute)
+    
+    
+    def pending(self, key):
+        """Return whether the value of a key is a Lazy value not computed
+        yet.
+        """
+        return isinstance(super().__getitem__(key), Lazy)
+    
+    
+    def items(self):
+        """Return the items whose value is computed. The Lazy values are
+        left out rather than computed, so walking the children of a node
+        doesn't parse the bodies that are parsed lazily.
+        """
+        return [(key, super(LazyBucket, self).__getitem__(key))
+                            for key in list(self) if not self.pending(key)]
+    
+    
+    def values(self):
+        return [value for key, value in self.items()]
+
+
+
 def EzNode(children=None, attrs=None):
     def decorator(cls):
         class generated(Node):
@@ -58,9 +115,12 @@ def EzNode(children=None, attrs=None):
 
 
 class Node(object):
+    # The type of the bucket holding the children of the node.
+    _childbucket = AttributeBucket
+    
     def __init__(self):
         super().__setattr__("a", AttributeBucket())
-        super().__setattr__("c", AttributeBucket())
+        super().__setattr__("c", self._childbucket())
     
     
     def __getattribute__(self, attr):
@@ -167,6 +227,144 @@ class NodeTransformer(NodeVisitor):
 
 
 
+# Returned by a pre_visit_* hook to prevent the children of a node from
+# being visited.
+SKIP = object()
+
+
+class _Frame(object):
+    __slots__ = ('node', 'args', 'kwargs', 'child_args', 'children', 'results')
+
+    def __init__(self, node, args, kwargs, child_args, children):
+        self.node = node
+        self.args = args
+        self.kwargs = kwargs
+        self.child_args = child_args
+        self.children = children
+        self.results = [ ]
+
+
+class IterativeVisitor(NodeVisitor):
+    """A NodeVisitor walking the tree with an explicit stack instead of the
+    Python call stack, so the depth of a tree is not limited by recursion.
+
+    pre_visit_<Class>(node, *args, **kwargs)
+        Called before the children of the node are visited. Return SKIP to
+        leave the children alone, a tuple to replace the positional
+        arguments passed to the children, or None to pass them unchanged.
+
+    post_visit_<Class>(node, *args, **kwargs)
+        Called after the children of the node were visited, with the same
+        arguments as the pre-order hook. Its return value is the result of
+        visiting the node.
+
+    A visit_<Class> method still takes over the whole subtree, like it does
+    with a NodeVisitor.
+    """
+    def visit(self, node, *args, **kwargs):
+        if not isinstance(node, (Node, Nodelist)):
+            raise TypeError("can't visit a node that is not a subclass of Node")
+        stack = [ ]
+        result = self._enter(stack, node, args, kwargs)
+        while stack:
+            frame = stack[-1]
+            if len(frame.results) < len(frame.children):
+                child_name, child = frame.children[len(frame.results)]
+                result = self._enter(stack, child, frame.child_args,
+                                                            frame.kwargs)
+                if stack[-1] is not frame:
+                    continue
+            else:
+                stack.pop()
+                result = self._leave(frame)
+                if not stack:
+                    break
+            stack[-1].results.append(result)
+        return result
+
+
+    def _enter(self, stack, node, args, kwargs):
+        """Push the frame of a node on the stack, or return the result of
+        visiting it right away when a visit_* method handles it.
+        """
+        if isinstance(node, Nodelist):
+            stack.append(_Frame(node, args, kwargs, args, node.children()))
+            return None
+
+        name = node.__class__.__name__
+        visitor = getattr(self, 'visit_' + name, None)
+        if visitor is not None:
+            return visitor(node, *args, **kwargs)
+
+        pre = getattr(self, 'pre_visit_' + name, self.generic_pre_visit)
+        child_args = pre(node, *args, **kwargs)
+        if child_args is SKIP:
+            children = ()
+        else:
+            children = node.children()
+        if child_args is None or child_args is SKIP:
+            child_args = args
+        stack.append(_Frame(node, args, kwargs, child_args, children))
+        return None
+
+
+    def _leave(self, frame):
+        node = frame.node
+        if isinstance(node, Nodelist):
+            return self.leave_list(frame)
+        self.collect(frame)
+        post = getattr(self, 'post_visit_' + node.__class__.__name__,
+                                                    self.generic_post_visit)
+        return post(node, *frame.args, **frame.kwargs)
+
+
+    def leave_list(self, frame):
+        return None
+
+
+    def collect(self, frame):
+        """Make use of the results of visiting the children of a node."""
+        pass
+
+
+    def generic_pre_visit(self, node, *args, **kwargs):
+        return None
+
+
+    def generic_post_visit(self, node, *args, **kwargs):
+        return node
+
+
+
+class IterativeTransformer(IterativeVisitor):
+    """An IterativeVisitor replacing each child of a node with the result
+    of visiting it, like a NodeTransformer does.
+    """
+    def leave_list(self, frame):
+        return Nodelist(frame.results)
+
+
+    def collect(self, frame):
+        for (child_name, child), result in zip(frame.children, frame.results):
+            setattr(frame.node, child_name, result)
+
+
+
+class LeafTable(dict):
+    """Share the leaf nodes built from equal values. The nodes obtained from
+    the table must be treated as immutable, since they may appear at many
+    places in a tree.
+    """
+    def intern(self, cls, *args):
+        key = (cls,) + args
+        try:
+            return self[key]
+        except KeyError:
+            leaf = self[key] = cls(*args)
+            return leaf
+
+
+
 class Program(Node):
     """
     decls   sequence of declarations
@@ -189,8 +387,10 @@ class Template(Node):
     """
     name    identifier
     params  list of parameter declarations
-    body    compound statement
+    body    compound statement, possibly computed on first access
     """
+    _childbucket = LazyBucket
+    
     def __init__(self, name, params, body):
         super().__init__()
         self.c.name = name
@@ -210,7 +410,7 @@ class ParameterDeclaration(Node):
 class ParameterIdentifier(Node):
     """
     name    string                  --> name of the C macro
-    params  list of strings or None --> parameters to the C macro
+    params  tuple of strings or None --> parameters to the C macro
     """
     def __init__(self, value, params):
         super().__init__()
@@ -3,7 +3,7 @@
 This package contains modules forming the code generation engine.
 """
 
-__all__ = [ ]
+__all__ = ['writer']
 
 
 if __name__ == "__main__":
@@ -0,0 +1,121 @@
+"""
+Writing the files produced by code generation.
+"""
+
+import os
+import time
+from collections import OrderedDict
+
+
+
+class OutputFile(object):
+    """A file created by a Writer. What is written to it is kept in memory
+    until the file is closed or flushed by the writer.
+    """
+    def __init__(self, writer, filename):
+        self.filename = filename
+        self._writer = writer
+        self._chunks = [ ]
+        self._flushed = False
+
+
+    def write(self, text):
+        self._chunks.append(text)
+        self._writer._touch(self)
+
+
+    def close(self):
+        self._writer.close(self)
+
+
+
+class Writer(object):
+    """Create, fill and close the files produced by code generation.
+
+    The contents of a file are written with a single call when the file is
+    closed, so at most one file is open at a time. When more than
+    max_pending files are buffered, the one written to least recently is
+    flushed to disk, and what is written to it afterwards is appended.
+    The writer counts what it does, see statistics(). If dry_run is True,
+    the writer only counts, without touching the files.
+    """
+    def __init__(self, overwrite=False, max_pending=64, dry_run=False):
+        if max_pending < 1:
+            raise ValueError("at least one file must be buffered")
+        self.overwrite = overwrite
+        self.max_pending = max_pending
+        self.dry_run = dry_run
+        self.filenames = [ ]
+        self._pending = OrderedDict()
+        self._bytes = 0
+        self._writes = 0
+        self._peak_pending = 0
+        self._wall = 0.0
+
+
+    def open(self, filename):
+        """Return a new OutputFile for the given path."""
+        filename = os.path.abspath(filename)
+        if not (self.overwrite or self.dry_run) and os.path.exists(filename):
+            raise IOError("can't overwrite the contents of " + filename)
+        file = OutputFile(self, filename)
+        self.filenames.append(filename)
+        self._touch(file)
+        return file
+
+
+    def close(self, file):
+        """Write what is left of a file to disk and forget about it."""
+        if file._chunks is None:
+            return
+        self._flush(file)
+        file._chunks = None
+
+
+    def close_all(self):
+        for file in list(self._pending):
+            self.close(file)
+
+
+    def statistics(self):
+        """Return an ordered mapping from the name of each statistic of the
+        writer to its value.
+        """
+        return OrderedDict([
+            ('files written', len(self.filenames)),
+            ('bytes written', self._bytes),
+            ('file writes', self._writes),
+            ('peak buffered files', self._peak_pending),
+            ('write time (ms)', round(self._wall * 1000, 1)),
+        ])
+
+
+    def _touch(self, file):
+        if file in self._pending:
+            self._pending.move_to_end(file)
+        else:
+            self._pending[file] = None
+            while len(self._pending) > self.max_pending:
+                self._flush(next(iter(self._pending)))
+            self._peak_pending = max(self._peak_pending, len(self._pending))
+
+
+    def _flush(self, file):
+        self._pending.pop(file, None)
+        if file._flushed and not file._chunks:
+            return
+        data = "".join(file._chunks).encode('utf-8')
+        file._chunks = [ ]
+        if not self.dry_run:
+            start = time.perf_counter()
+            with open(file.filename, 'ab' if file._flushed else 'wb') as out:
+                out.write(data)
+            self._wall += time.perf_counter() - start
+        self._bytes += len(data)
+        self._writes += 1
+        file._flushed = True
+
+
+
+if __name__ == "__main__":
+    pass
@@ -1,8 +1,25 @@
 from . import parse
+from . import stats
+from . import interface
 from .passes import *
 
 import os
+import sys
 import argparse
+import tracemalloc
+
+
+def _count(text):
+    """Parse a number of packages, depths or jobs, which must be at least 1."""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError("must be at least 1, not {}".format(value))
+    return value
+
+
+def _depth_count(text):
+    """Parse a number of depths, or 'auto' to find it from the program."""
+    return text if text == 'auto' else _count(text)
 
 
 class Compiler(object):
@@ -14,34 +31,134 @@ class Compiler(object):
         self.args.add_argument('file', nargs='+', help="The input file(s) to process.")
         self.args.add_argument('-o', default=os.curdir, help="Specify the directory for the output.")
         self.args.add_argument('-f', action='store_true', help="Do not prompt before overwriting files in the output directories.")
+        self.args.add_argument('--stats', action='store_true', help="Report the time and memory spent in each phase of the compilation.")
+        self.args.add_argument('--stats-json', metavar='FILE', help="Write the statistics of the compilation to a file in the JSON format.")
+        self.args.add_argument('-j', '--jobs', type=_count, default=1, help="Resolve the names used in templates with the given number of worker processes. The workers are forked, so they are only used when the compiler can fork and runs no other thread.")
+        self.args.add_argument('-I', '--interface', metavar='FILE', action='append', default=[ ], help="Load the precompiled interface of a library used by the input files.")
+        self.args.add_argument('--emit-interface', metavar='FILE', help="Write the precompiled interface of the input files to a file.")
+        self.args.add_argument('--root', metavar='NAME', action='append', default=[ ], help="Only generate the templates reachable from the template or namespace with the given fully qualified name. Can be given more than once.")
+        self.args.add_argument('--if-tree', action='store_true', help="Find the current package and depth with balanced trees of range tests instead of testing each value in turn.")
+        self.args.add_argument('--max-depth', type=_depth_count, default=codegen.NstlDefaultEnv['max_depth'], help="Generate the templates for the given number of depths, or with auto, for one more than the longest chain of nested templates, falling back to the default if a template can nest itself. Defaults to %(default)s. auto can't be used with --emit-interface, since the clients of an interface can nest its templates deeper.")
+        self.args.add_argument('--max-package', type=_count, default=codegen.NstlDefaultEnv['max_package'], help="Generate the templates for the given number of packages. Defaults to %(default)s.")
+        self.args.add_argument('--prune-depths', action='store_true', help="Only generate each template for the depths it can be imported or nested at from the program, instead of for every depth. Can't be used with --emit-interface, since the clients of an interface can nest its templates at any depth.")
+        self.args.add_argument('--index', metavar='FILE', help="Write the fully qualified names of all the namespaces and templates to a file in the JSON format.")
     
     
     def compile(self, argv):
         args = self.args.parse_args(argv)
+        if args.max_depth == 'auto' and args.emit_interface is not None:
+            self.args.error("--max-depth auto can't be used with --emit-interface")
+        if args.prune_depths and args.emit_interface is not None:
+            self.args.error("--prune-depths can't be used with --emit-interface")
         outputdir = args.o
+        report = args.stats or args.stats_json is not None
+        
+        if report:
+            tracemalloc.start()
+        st = stats.Statistics(trace_memory=report)
         
         parser = parse.NstlParser()
+        tokenfunc = None
+        if report:
+            # A body parsed lazily is a single token for the main lexer,
+            # and its tokens are counted when the body lexer reads them.
+            tokenfunc = st.counting('tokens', parser.lexer.token,
+                                            lambda tok: tok.type != 'tBODY')
+            parser.bodytokenfunc = st.counting('tokens', parser.bodylexer.token)
         
         asts = [ ]
-        for filename in args.file:
-            with open(filename, 'r') as file:
-                input_text = "".join(file)
-                asts.append(parser.parse(input_text))
+        for filename in args.interface:
+            with st.phase("load interfaces"):
+                with open(filename, 'rb') as file:
+                    asts.append(interface.load(file))
         
-        ast = nameresolve.merge_asts(*asts)
+        for filename in args.file:
+            with st.phase("read"):
+                with open(filename, 'r') as file:
+                    input_text = "".join(file)
+            with st.phase("lex and parse"):
+                asts.append(parser.parse(input_text, tokenfunc=tokenfunc))
         
-        nameres = nameresolve.NameResolver()
-        nameres.visit(ast)
+        with st.phase("merge_asts"):
+            ast = nameresolve.merge_asts(*asts)
         
-        pathbuild = pathresolve.PathBuilder()
-        pathbuild.visit(ast)
+        paths = pathresolve.PathTable()
+        base = paths.path(os.path.abspath(outputdir))
+        passes = passmanager.PassManager(nameresolve.NameCollector(),
+                                         nameresolve.NameResolver(args.jobs),
+                                         pathresolve.PathBuilder(paths, base))
+        if args.root:
+            passes.add(prune.Pruner(args.root))
+        context = passmanager.Context()
+        for group in passes.schedule():
+            with st.phase(" + ".join(type(pass_).__name__ for pass_ in group)):
+                ast = passes.run_group(group, ast, context)
+        resolution = context.resolution
+        if report:
+            st.count_nodes(ast)
+        if args.index is not None:
+            with open(args.index, 'w') as file:
+                nameresolve.dump_index(resolution.index, file)
+        if args.emit_interface is not None:
+            with open(args.emit_interface, 'wb') as file:
+                interface.dump(resolution, file)
         
         if not os.path.exists(outputdir):
             os.makedirs(outputdir)
-        os.chdir(outputdir)
         
-        generator = codegen.Generator(args.f)
-        generator.visit(ast)
+        max_depth = args.max_depth
+        if max_depth == 'auto':
+            with st.phase("nest depth"):
+                depth = nestgraph.max_nest_depth(ast, resolution)
+            max_depth = codegen.NstlDefaultEnv['max_depth'] if depth is None \
+                                                                else depth + 1
+        env = codegen.Environment(codegen.NstlDefaultEnv, max_depth=max_depth,
+                                                max_package=args.max_package)
+        depths = None
+        if args.prune_depths:
+            with st.phase("instantiation depths"):
+                depths = nestgraph.instantiation_depths(ast, resolution,
+                                                                    max_depth)
+        
+        writer = codegen.Writer(args.f)
+        generator = codegen.Generator(args.f, env, paths=paths, base=base,
+                        tree=args.if_tree, depths=depths, writer=writer)
+        with st.phase("lowering and emission"):
+            generator.visit(ast, resolution)
+            generator.close()
+        
+        if report:
+            tracemalloc.stop()
+            st.count('files', len(args.file))
+            for name, value in generator.writer.statistics().items():
+                st.count(name, value)
+            st.count('max depth', max_depth)
+            if args.max_depth == 'auto' or args.prune_depths:
+                st.count('bytes saved by depth analysis',
+                        self._bytes_saved(generator, ast, resolution, args))
+            if args.stats:
+                st.show(sys.stdout)
+            if args.stats_json is not None:
+                with open(args.stats_json, 'w') as file:
+                    st.dump(file)
+    
+    
+    def _bytes_saved(self, generator, ast, resolution, args):
+        """Return how many bytes more the program takes when it is generated
+        for every depth up to the given or the default max depth.
+        """
+        max_depth = args.max_depth
+        if max_depth == 'auto':
+            max_depth = codegen.NstlDefaultEnv['max_depth']
+        env = codegen.Environment(generator.env, max_depth=max_depth)
+        writer = codegen.Writer(dry_run=True)
+        default = codegen.Generator(True, env, paths=generator.paths,
+                                    base=generator.base, tree=args.if_tree,
+                                    writer=writer)
+        default.visit(ast, resolution)
+        default.close()
+        return (default.writer.statistics()['bytes written'] -
+                generator.writer.statistics()['bytes written'])
 
 
 
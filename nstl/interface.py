@@ -0,0 +1,62 @@
+"""
+Precompiled interfaces of nstl libraries.
+
+An interface holds the declarations of every namespace and template of a
+library, with the parameters of the templates but without their bodies.
+It is enough to resolve the names a program imports from the library and
+to generate the code using them, so a library can be compiled once and its
+interface loaded in place of its sources afterwards. The declarations of
+an interface are marked as external, and no code is generated for them.
+
+Interfaces are stored in the format of the serialize module. The symbol
+table of the library is rebuilt from the declarations when names are
+collected, which does not require any template body.
+"""
+
+from . import ast
+from . import serialize
+from .passes import nameresolve
+
+
+
+def make_interface(resolution):
+    """Return the interface of a program, from the Resolution its names were
+    collected in.
+
+    Each namespace and template appears once, under its fully qualified
+    name, even if it was reopened from a nested namespace.
+    """
+    qualnames = nameresolve.canonical_names(resolution.index)
+    root = ast.Program([ ])
+    copies = {'': root}
+    for qualname, decl in resolution.index.items():
+        if qualnames[id(decl)] != qualname:
+            continue
+        if isinstance(decl, ast.Namespace):
+            copy = ast.Namespace(ast.Identifier(decl.name.value), [ ])
+        else:
+            copy = ast.Template(ast.Identifier(decl.name.value),
+                                                    decl.params, None)
+        copy.a.external = True
+        copies[qualname.rpartition('.')[0]].decls.append(copy)
+        copies[qualname] = copy
+    return root
+
+
+def dump(resolution, file):
+    """Write the interface of a program, from the Resolution its names were
+    collected in, to a binary file.
+    """
+    serialize.dump(make_interface(resolution), file)
+
+
+def load(file):
+    """Return the interface stored in a binary file, as an ast.Program to
+    be merged with the programs using it.
+    """
+    return serialize.load(file)
+
+
+
+if __name__ == "__main__":
+    pass
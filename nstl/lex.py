@@ -1,5 +1,8 @@
 from .ply import lex
 
+import re
+import sys
+
 
 
 class LexError(Exception):
@@ -10,12 +13,24 @@ class LexError(Exception):
 class NstlLexer(object):
     """A lexer for the nstl domain specific language. After building the lexer,
         set the input text with input(), and call token() to get new tokens.
+        
+        If lazybodies is True, the body of each template is returned as a
+        single tBODY token whose value is a SourceSpan, and the body is left
+        to be lexed later.
     """
+    def __init__(self, lazybodies=False):
+        self.lazybodies = lazybodies
+        self.template_header = False
+    
     def build(self, **kwargs):
         """Builds the lexer from the specification.
         """
         self.lexer = lex.lex(object=self, **kwargs)
     
+    def input(self, text):
+        self.template_header = False
+        self.lexer.input(text)
+    
     def __getattribute__(self, attr):
         get = super().__getattribute__
         try:
@@ -53,6 +68,7 @@ class NstlLexer(object):
         'tLPAREN', 'tRPAREN',
         'tLBRACE', 'tRBRACE',
         'tRAWBEGIN', 'tRAWEND', 'tRAWINPUT',
+        'tBODY',
         
         'tCOMMA', 'tPERIOD', 'tEQUALS',
     )
@@ -84,7 +100,6 @@ class NstlLexer(object):
     ##
     t_ignore = " \t"
     
-    t_tLBRACE       = r"\{"
     t_tRBRACE       = r"\}"
     t_tLPAREN       = r"\("
     t_tRPAREN       = r"\)"
@@ -122,6 +137,9 @@ class NstlLexer(object):
     @lex.TOKEN(identifier)
     def t_tID(self, t):
         t.type = self.keywordMap.get(t.value, t.type)
+        t.value = sys.intern(t.value)
+        if t.type == 'tTEMPLATE':
+            self.template_header = self.lazybodies
         return t
     
     
@@ -142,6 +160,19 @@ class NstlLexer(object):
         return t
     
     
+    # Must come after tRAWBEGIN, which also starts with a brace.
+    def t_tLBRACE(self, t):
+        r"\{"
+        if self.template_header:
+            self.template_header = False
+            end = skip_body(t.lexer.lexdata, t.lexpos)
+            t.type = 'tBODY'
+            t.value = SourceSpan(t.lexer.lexdata, t.lexpos, end, t.lineno)
+            t.lexer.lexpos = end
+            t.lexer.lineno += t.lexer.lexdata.count("\n", t.lexpos, end)
+        return t
+    
+    
     # Always count newlines
     def t_ANY_newline(self, t):
         r"\n+"
@@ -155,5 +186,49 @@ class NstlLexer(object):
 
 
 
+class SourceSpan(object):
+    """A part of the text given to the lexer, which starts at line lineno.
+    """
+    __slots__ = ('data', 'start', 'end', 'lineno')
+    
+    def __init__(self, data, start, end, lineno):
+        self.data = data
+        self.start = start
+        self.end = end
+        self.lineno = lineno
+    
+    def text(self):
+        return self.data[self.start:self.end]
+
+
+
+_body_delimiters = re.compile(r"\{%|/\*|//|[{}]")
+_body_closers = {'{%': '%}', '/*': '*/', '//': '\n'}
+
+def skip_body(data, pos):
+    """Return the position following the brace that closes the one at pos.
+    Braces inside raw input and comments are not counted.
+    """
+    depth = 0
+    while True:
+        match = _body_delimiters.search(data, pos)
+        if match is None:
+            raise LexError("{}: unterminated template body"
+                                .format(data.count("\n", 0, pos) + 1))
+        delimiter = match.group()
+        pos = match.end()
+        if delimiter == '{':
+            depth += 1
+        elif delimiter == '}':
+            depth -= 1
+            if depth == 0:
+                return pos
+        else:
+            closer = _body_closers[delimiter]
+            end = data.find(closer, pos)
+            pos = len(data) if end == -1 else end + len(closer)
+
+
+
 if __name__ == "__main__":
     pass
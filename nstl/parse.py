@@ -12,18 +12,52 @@ class ParseError(Exception):
 
 class NstlParser(object):
 	def __init__(self, lexoptimize=True, lextab='_lextab',
-					yaccoptimize=True, yacctab='_yacctab', yaccdebug=False):
+					yaccoptimize=True, yacctab='_yacctab', yaccdebug=False,
+					lazybodies=True):
 		"""Create a new parser for the nstl micro-language.
+		
+		If lazybodies is True, the body of each template is only parsed
+		the first time it is accessed. Bodies are then lexed with the
+		bodytokenfunc attribute, if it is set, like the tokenfunc argument
+		of parse.
 		"""
-		self.lexer = lex.NstlLexer()
+		self.lexer = lex.NstlLexer(lazybodies)
 		self.lexer.build(optimize=lexoptimize, lextab=lextab)
 		self.tokens = self.lexer.tokens
 		self.parser = yacc.yacc(module=self, debug=yaccdebug,
 									optimize=yaccoptimize, tabmodule=yacctab)
+		if lazybodies:
+			# Bodies are lexed by a lexer of their own, since they may be
+			# parsed while the main lexer is busy with another input. Their
+			# parser builds its tables in memory, without writing them to
+			# the current directory.
+			self.bodylexer = lex.NstlLexer()
+			self.bodylexer.build(optimize=lexoptimize, lextab=lextab)
+			self.bodyparser = yacc.yacc(module=self, debug=False,
+							start='compound-statement', optimize=yaccoptimize,
+							tabmodule=yacctab + '_body', write_tables=False,
+							errorlog=yacc.NullLogger())
+			self.bodytokenfunc = None
 	
 	def parse(self, text, **kwargs):
+		# The leaf nodes are shared within a program, including the bodies
+		# of its templates parsed later, but not between programs.
+		self.leaves = ast.LeafTable()
 		return self.parser.parse(text, lexer=self.lexer, **kwargs)
 	
+	def parse_body(self, span, leaves=None):
+		"""Parse the body of a template from its source span. The leaf nodes
+		are shared through the given LeafTable, or a table of their own.
+		"""
+		outer = getattr(self, 'leaves', None)
+		self.leaves = ast.LeafTable() if leaves is None else leaves
+		try:
+			self.bodylexer.lineno = span.lineno
+			return self.bodyparser.parse(span.text(), lexer=self.bodylexer,
+											tokenfunc=self.bodytokenfunc)
+		finally:
+			self.leaves = outer
+	
 	def accumulate(self, p, skip=0):
 		"""This function accumulates tokens in a sequence or list. This is
 		    useful for all non terminals with the following pattern.
@@ -78,8 +112,13 @@ class NstlParser(object):
 	
 	def p_template_body(self, p):
 	    """template-body : compound-statement
+	                     | tBODY
 	    """
-	    p[0] = p[1]
+	    if isinstance(p[1], lex.SourceSpan):
+	        span, leaves = p[1], self.leaves
+	        p[0] = ast.Lazy(lambda: self.parse_body(span, leaves))
+	    else:
+	        p[0] = p[1]
 	
 	def p_parameter_declaration_clause(self, p):
 	    """parameter-declaration-clause : nothing
@@ -103,7 +142,8 @@ class NstlParser(object):
 	    """parameter-id : tID
 	                    | tID tLPAREN tID-list-opt tRPAREN
 	    """
-	    p[0] = ast.ParameterIdentifier(p[1], None if len(p) == 2 else p[3])
+	    params = None if len(p) == 2 or p[3] is None else tuple(p[3])
+	    p[0] = self.leaves.intern(ast.ParameterIdentifier, p[1], params)
 	
 	def p_tID_list_opt(self, p):
 	    """tID-list-opt : nothing
@@ -231,9 +271,10 @@ class NstlParser(object):
 	    p[0] = self.accumulate(p, skip=1)
 	
 	def p_namespace_name(self, p):
-	    """namespace-name : identifier
+	    """namespace-name : tID
 	    """
-	    p[0] = p[1]
+	    # Qualifiers are never resolved on their own, so they can be shared.
+	    p[0] = self.leaves.intern(ast.Identifier, p[1])
 	
 	def p_identifier(self, p):
 	    """identifier : tID
@@ -1,6 +1,7 @@
 
 
-__all__ = ['pathresolve', 'codegen', 'nameresolve']
+__all__ = ['pathresolve', 'codegen', 'nameresolve', 'passmanager', 'astdiff',
+           'prune', 'nestgraph']
 
 
 if __name__ == "__main__":
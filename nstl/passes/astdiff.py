@@ -0,0 +1,195 @@
+from .. import ast
+from . import passmanager
+from .nameresolve import NameResolver
+from .nestgraph import edges, _components
+
+import sys
+import hashlib
+from collections import OrderedDict
+
+
+
+class _Fingerprinter(ast.IterativeVisitor):
+    """Compute the fingerprint of every namespace and template of a tree,
+    keyed by qualified name, with the Resolution of the tree.
+
+    The fingerprint of a template covers its parameters, the nodes of its
+    body and the fingerprints of the templates it imports or nests, so a
+    template changes along with the templates it depends on. The templates
+    depending on each other share the fingerprints of all of them. Only
+    plain attribute values are part of it, so what passes add to the tree,
+    like paths, does not change it, and a body parsed lazily is
+    fingerprinted like the same body parsed right away. The fingerprint of
+    a namespace covers the fingerprints of everything declared inside of
+    it, including in all the places where the namespace is reopened.
+    """
+    def __init__(self, resolution):
+        self.resolution = resolution
+        self.kinds = OrderedDict()
+        self.members = { }
+        self.templates = OrderedDict()
+        self.digests = { }
+
+
+    def pre_visit_Program(self, root):
+        return ('',)
+
+
+    def pre_visit_Namespace(self, node, prefix):
+        name = prefix + node.name.value
+        self._declare(prefix, name, 'namespace')
+        self.members.setdefault(name, set())
+        return (name + '.',)
+
+
+    def pre_visit_Template(self, node, prefix):
+        name = prefix + node.name.value
+        self._declare(prefix, name, 'template')
+        hasher = hashlib.sha1()
+        _feed(hasher, node.params)
+        if node.body is not None:
+            _feed(hasher, node.body)
+        self.templates[node] = name
+        self.digests[node] = hasher.hexdigest()
+        return ast.SKIP
+
+
+    def _declare(self, prefix, name, kind):
+        self.kinds[name] = kind
+        if prefix:
+            self.members[prefix[:-1]].add(name)
+
+
+    def _fold_dependencies(self):
+        """Return a mapping from the qualified name of each template to its
+        fingerprint, folding in the fingerprints of its dependencies.
+        """
+        names = self.templates
+        successors = lambda template: [target for nested, target
+                                    in edges(template, self.resolution)
+                                                        if target in names]
+        digests = { }
+        # Components come after the ones they reach, whose fingerprints are
+        # then known.
+        for members in _components(names, successors):
+            targets = set(target for template in members
+                                    for target in successors(template))
+            hasher = hashlib.sha1()
+            for template in sorted(targets | set(members), key=names.get):
+                digest = (self.digests[template] if template in members
+                                            else digests[names[template]])
+                hasher.update("{} {}\n".format(names[template],
+                                                        digest).encode())
+            component = hasher.hexdigest()
+            for template in members:
+                digests[names[template]] = hashlib.sha1("{} {}".format(
+                        self.digests[template], component).encode()).hexdigest()
+        return digests
+
+
+    def fingerprints(self):
+        digests = self._fold_dependencies()
+        # Inner namespaces have longer names, so they are done first.
+        for name in sorted(self.kinds, key=len, reverse=True):
+            if self.kinds[name] == 'template':
+                continue
+            hasher = hashlib.sha1()
+            for member in sorted(self.members[name]):
+                hasher.update("{} {} {}\n".format(self.kinds[member],
+                                    member, digests[member]).encode())
+            digests[name] = hasher.hexdigest()
+        return OrderedDict((name, (kind, digests[name]))
+                                        for name, kind in self.kinds.items())
+
+
+
+def _feed(hasher, node):
+    if isinstance(node, ast.Nodelist):
+        hasher.update("[{}".format(len(node)).encode())
+        for item in node:
+            _feed(hasher, item)
+        hasher.update(b"]")
+        return
+
+    hasher.update("({}".format(node.__class__.__name__).encode())
+    for name, value in node.a.items():
+        if value is None or isinstance(value, (str, int, tuple)):
+            hasher.update(" {}={!r}".format(name, value).encode())
+    for name, child in node.children():
+        hasher.update(" {}:".format(name).encode())
+        _feed(hasher, child)
+    hasher.update(b")")
+
+
+
+def fingerprints(program, resolution=None):
+    """Return an ordered mapping from the qualified name of each namespace
+    and template of a program to a (kind, fingerprint) pair, where kind is
+    either 'namespace' or 'template'. The mapping can be kept in place of
+    the program to be compared with a later version of it.
+
+    The names of the program are resolved unless its Resolution is given.
+    The bodies of the templates are parsed to find what they depend on.
+    """
+    if resolution is None:
+        context = passmanager.Context()
+        program = NameResolver().visit(program, context)
+        resolution = context.resolution
+    fingerprinter = _Fingerprinter(resolution)
+    fingerprinter.visit(program)
+    return fingerprinter.fingerprints()
+
+
+
+class Diff(object):
+    """The differences between two versions of a program.
+
+    added, removed and changed are sorted lists of (kind, qualified name)
+    pairs, where kind is either 'namespace' or 'template'.
+    """
+    def __init__(self, added, removed, changed):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+
+    def show(self, buf=sys.stdout):
+        for mark, entries in (('+', self.added), ('-', self.removed),
+                                                    ('~', self.changed)):
+            for kind, name in entries:
+                buf.write("{} {} {}\n".format(mark, kind, name))
+
+
+
+def diff(old, new):
+    """Compare two versions of a program, given either as ast.Program nodes
+    or as mappings returned by fingerprints(). A declaration whose kind
+    changed is reported as removed and added.
+    """
+    if isinstance(old, ast.Node):
+        old = fingerprints(old)
+    if isinstance(new, ast.Node):
+        new = fingerprints(new)
+
+    added, removed, changed = [ ], [ ], [ ]
+    for name, (kind, digest) in new.items():
+        if name not in old or old[name][0] != kind:
+            added.append((kind, name))
+        elif old[name][1] != digest:
+            changed.append((kind, name))
+    for name, (kind, digest) in old.items():
+        if name not in new or new[name][0] != kind:
+            removed.append((kind, name))
+
+    key = lambda entry: (entry[1], entry[0])
+    return Diff(sorted(added, key=key), sorted(removed, key=key),
+                                        sorted(changed, key=key))
+
+
+
+if __name__ == "__main__":
+    pass
@@ -1,6 +1,10 @@
 from .. import ast
+from .pathresolve import PathTable
+from ..codegen.writer import Writer, OutputFile
 
 from string import Template
+from functools import lru_cache
+from collections import OrderedDict
 import sys
 import os
 
@@ -97,6 +101,58 @@ class StructuredEmitter(object):
 
 
 
+class CompiledTemplate(object):
+    """A string.Template compiled into the sequence of its literal parts and
+    the names of the placeholders between them.
+    """
+    __slots__ = ('literals', 'names')
+    
+    def __init__(self, text):
+        literals, names = [ ], [ ]
+        literal, pos = '', 0
+        for match in Template.pattern.finditer(text):
+            literal += text[pos:match.start()]
+            pos = match.end()
+            name = match.group('named') or match.group('braced')
+            if name is not None:
+                literals.append(literal)
+                names.append(name)
+                literal = ''
+            elif match.group('escaped') is not None:
+                literal += Template.delimiter
+            else:
+                start = match.start('invalid')
+                lines = text[:start].splitlines(True)
+                line, col = 1, 1
+                if lines:
+                    line, col = len(lines), start - len("".join(lines[:-1]))
+                raise ValueError(
+                    "Invalid placeholder in string: line {}, col {}".format(line, col))
+        literals.append(literal + text[pos:])
+        self.literals = tuple(literals)
+        self.names = tuple(names)
+    
+    
+    def render(self, env, overrides):
+        """Substitute the placeholders with their value in overrides, or in
+        env if they are not in overrides.
+        """
+        literals = self.literals
+        parts = [literals[0]]
+        for name, literal in zip(self.names, literals[1:]):
+            value = overrides[name] if name in overrides else env[name]
+            parts.append(str(value))
+            parts.append(literal)
+        return "".join(parts)
+
+
+@lru_cache(maxsize=1024)
+def compile_template(text):
+    """Return the CompiledTemplate of a text, compiling it once."""
+    return CompiledTemplate(text)
+
+
+
 class TemplatedEmitter(StructuredEmitter):
     """A class to emit templated output.
     """
@@ -128,18 +184,40 @@ class TemplatedEmitter(StructuredEmitter):
     
     
     def subs(self, text, **env):
-        return Template(text).substitute(self.env, **env)
+        return compile_template(text).render(self.env, env)
 
 
 
 class _AstPreparator(ast.NodeTransformer):
-    def visit_Template(self, template):
+    """Lower a program to the form used by the Generator.
+    
+    The paths of namespaces and templates are derived from the path of the
+    namespace they are visited from, so a namespace appearing at several
+    places is generated at each of them. The templates a statement refers
+    to are found in the Resolution of the program. The program itself is
+    left alone, so it can be lowered more than once.
+    """
+    def __init__(self, paths, resolution, depths=None):
+        self.paths = paths
+        self.resolution = resolution
+        self.depths = { } if depths is None else depths
+    
+    
+    def visit_Program(self, program, parent=None):
+        return ast.Program(self.visit(program.decls, parent))
+    
+    
+    def visit_Template(self, template, parent=None):
         # Template :
         #  [name            -> string
         #   path            -> string
+        #   directory       -> string  (path to the directory of the files)
         #   content_file    -> string  (path to the non-top level include file)
         #   package_file    -> string  (path to the top level include file)
         #   body_file       -> string  (path to the body of the template)
+        #   external        -> bool    (declared in a precompiled interface)
+        #   depths          -> list<int> or None  (the depths it can be
+        #                                          instantiated at, or all)
         #   body**          -> Import|Nest|(RawExpression   -> string)
         #   params**        -> ParameterDeclaration]
         @ast.EzNode(children=('params', 'body'))
@@ -147,12 +225,19 @@ class _AstPreparator(ast.NodeTransformer):
             pass
         
         name = template.name.value
+        external = template.a.get('external', False)
+        path = self.paths.declared[template] if parent is None else \
+                                            self.paths.path(name, parent)
         return Template(name=name,
-                        path=str(template.path),
+                        path=str(path),
+                        directory=os.path.dirname(str(path)) or os.curdir,
                         content_file=name + ".contents",
                         body_file=name + ".body",
                         package_file=name + ".h",
-                        body=self.visit(template.body.stmnts),
+                        external=external,
+                        depths=self.depths.get(template),
+                        body=ast.Nodelist() if external
+                                    else self.visit(template.body.stmnts),
                         params=self.visit(template.params))
     
     
@@ -170,18 +255,23 @@ class _AstPreparator(ast.NodeTransformer):
                                 default=decl.default and decl.default.value)
     
     
-    def visit_Namespace(self, namespace):
+    def visit_Namespace(self, namespace, parent=None):
         # Namespace :
         #   [name       -> string
         #    path       -> string
+        #    external   -> bool    (nothing to generate inside of it)
         #    decls**    -> Template|Namespace]
-        @ast.EzNode(attrs=('name', 'path'))
+        @ast.EzNode(attrs=('name', 'path', 'external'))
         class Namespace(object):
             pass
         
+        path = self.paths.path(namespace.name.value, parent)
+        decls = self.visit(namespace.decls, path)
         return Namespace(name=namespace.name.value,
-                            path=str(namespace.path),
-                            decls=self.visit(namespace.decls))
+                            path=str(path),
+                            external=namespace.a.get('external', False) and
+                                        all(decl.external for decl in decls),
+                            decls=decls)
     
     
     def visit_ArgumentExpression(self, expr):
@@ -207,7 +297,8 @@ class _AstPreparator(ast.NodeTransformer):
             pass
         
         return ImportStatement(args=self.visit(impt.args),
-        templates=ast.Nodelist(self.visit(ref.resolved) for ref in impt.refs))
+        templates=ast.Nodelist(self.visit(self.resolution.resolved[ref])
+                                                    for ref in impt.refs))
     
     
     def visit_NestStatement(self, nest):
@@ -219,7 +310,7 @@ class _AstPreparator(ast.NodeTransformer):
             pass
         
         return NestStatement(args=self.visit(nest.args),
-                             template=self.visit(nest.ref.resolved))
+                    template=self.visit(self.resolution.resolved[nest.ref]))
 
 
 
@@ -231,6 +322,7 @@ NstlDefaultEnv = Environment(
         package_incr = '#include <params/package/incr.h>',
         max_depth = 5,
         max_package = 5,
+        slots = '0slots',
     )
 
 #   List of placeholders used in the templates below.
@@ -242,53 +334,192 @@ NstlDefaultEnv = Environment(
 #                       package number when preprocessed.
 # get_depth           The name of a macro that must expand to the current
 #                       depth when preprocessed.
+# slots               The directory of the slot files of the DispatchGenerator,
+#                       relative to the output directory.
 
 fmt_arg_list = lambda a: "(" + ", ".join(a) + ")" if a is not None else ""
 
+@lru_cache(maxsize=1024)
+def _compress(text):
+    """Strip the lines of a text and remove the empty ones."""
+    return "\n".join(filter(None, map(str.lstrip, text.splitlines())))
+
 class Generator(ast.NodeVisitor, TemplatedEmitter):
-    def __init__(self, overwrite=False, env=NstlDefaultEnv, *args, **kwargs):
+    """Generate the files of a program inside of the directory with the
+    given base path, or inside of the current directory if base is None.
+    The paths are interned in the given PathTable, which should be the one
+    used by the PathBuilder. The files are created by the given Writer.
+    Each file is closed as soon as the generator moves to the next one.
+    A program is visited along with the Resolution of its names.
+    
+    If tree is True, the package and the depth are found by testing the
+    half of their range they are in, instead of testing each value in turn.
+    
+    If depths is given, it maps templates to the depths they can be
+    instantiated at, see nestgraph.instantiation_depths(). Nothing is
+    generated for the other depths of these templates.
+    """
+    def __init__(self, overwrite=False, env=NstlDefaultEnv, *args,
+                    paths=None, base=None, writer=None, tree=False,
+                    depths=None, **kwargs):
         super().__init__(*args, env=env, **kwargs)
         self.overwrite = overwrite
+        self.tree = tree
+        self.depths = depths
+        self.paths = PathTable() if paths is None else paths
+        self.base = base
+        self.writer = Writer(overwrite) if writer is None else writer
+    
+    
+    @property
+    def filenames(self):
+        return self.writer.filenames
     
     
     def emit(self, output, newline=True, **env):
         """This method provides an optimization to reduce the total number
         of lines by removing empty lines.
         """
-        lines = map(str.lstrip, output.splitlines())
-        compressed = "\n".join(filter(None, lines))
-        super().emit(compressed, newline, **env)
+        super().emit(_compress(output), newline, **env)
     
     
     def setstream(self, filename):
-        if not self.overwrite and os.path.exists(filename):
-            raise IOError("can't overwrite the contents of " + filename)
-        super().setstream(open(filename, 'w'))
+        self._closestream()
+        super().setstream(self.writer.open(filename))
     
     
-    def visit_Program(self, root):
-        root = _AstPreparator().visit(root)
+    def close(self):
+        """Close all the files opened by the generator."""
+        self._closestream()
+        super().setstream(sys.stdout)
+        self.writer.close_all()
+        self._knownstreams.clear()
+    
+    
+    def _closestream(self):
+        if isinstance(self._ostream, OutputFile):
+            self._ostream.close()
+            self._knownstreams.pop(self._ostream, None)
+    
+    
+    def _dispatch(self, macro, key, values, emit_case):
+        """Emit a case for each of the given values the given macro can
+        expand to, in increasing order. The value of the case is set as
+        env[key] while emit_case() is called.
+        """
+        values = list(values)
+        if not values:
+            return
+        if self.tree:
+            self.emit("""
+            #if ${macro} < ${count}
+            """, macro=macro, count=values[-1] + 1)
+            self.indent()
+            self._bisect(macro, key, values, 0, values[-1] + 1, emit_case)
+            self.dedent()
+            self.emit("""
+            #endif
+            """)
+            return
+        
+        for value in values:
+            self.env[key] = value
+            self.emit("""
+            #if ${macro} == ${value}
+            """, macro=macro, value=value)
+            self.indent()
+            emit_case()
+            self.dedent()
+            self.emit("""
+            #endif
+            """)
+    
+    
+    def _bisect(self, macro, key, values, low, high, emit_case):
+        """Emit the cases of the values as a balanced tree of range tests,
+        knowing the value of the macro is from low to high - 1.
+        """
+        if len(values) == 1:
+            self.env[key] = values[0]
+            if high - low == 1:
+                emit_case()
+            else:
+                self.emit("""
+                #if ${macro} == ${value}
+                """, macro=macro, value=values[0])
+                self.indent()
+                emit_case()
+                self.dedent()
+                self.emit("""
+                #endif
+                """)
+            return
+        
+        half = len(values) // 2
+        middle = values[half]
+        self.emit("""
+        #if ${macro} < ${middle}
+        """, macro=macro, middle=middle)
+        self._bisect(macro, key, values[:half], low, middle, emit_case)
+        self.emit("""
+        #else
+        """)
+        self._bisect(macro, key, values[half:], middle, high, emit_case)
+        self.emit("""
+        #endif
+        """)
+    
+    
+    def _dispatch_grid(self, emit_case, depths=None):
+        """Emit a case for each package and each of the given depths, or
+        each depth if depths is None.
+        """
+        if depths is None:
+            depths = range(self.env['max_depth'])
+        self._dispatch(self.env['get_package'], 'package',
+                        range(self.env['max_package']),
+                        lambda: self._dispatch(self.env['get_depth'], 'depth',
+                                                        depths, emit_case))
+    
+    
+    def visit_Program(self, root, resolution):
+        root = _AstPreparator(self.paths, resolution,
+                                        self.depths).visit(root, self.base)
+        self._makedirs(root)
         self.generic_visit(root)
     
     
+    def _makedirs(self, root):
+        """Create the directories of all the namespaces at once."""
+        directories = set()
+        pending = list(root.decls)
+        while pending:
+            decl = pending.pop()
+            if hasattr(decl, 'decls') and not decl.external:
+                directories.add(decl.path)
+                pending.extend(decl.decls)
+        for directory in sorted(directories):
+            os.makedirs(directory, exist_ok=True)
+    
+    
     def visit_Namespace(self, namespace):
-        previous = os.getcwd()
-        if not os.path.exists(namespace.name):
-            os.mkdir(namespace.name)
-        os.chdir(namespace.name)
+        if namespace.external:
+            return
         for decl in namespace.decls:
             self.visit(decl)
-        os.chdir(previous)
     
     
     def visit_Template(self, template):
-        self.setstream(template.package_file)
+        if template.external:
+            return
+        self.setstream(os.path.join(template.directory, template.package_file))
         self._emit_packagefile(template)
         
-        self.setstream(template.content_file)
+        self.setstream(os.path.join(template.directory, template.content_file))
         self._emit_contentfile(template)
         
-        self.setstream(template.body_file)
+        self.setstream(os.path.join(template.directory, template.body_file))
+        self._template = template
         for stmnt in template.body:
             if isinstance(stmnt, ast.RawExpression):
                 self.emit_raw(stmnt.value)
@@ -309,14 +540,8 @@ class Generator(ast.NodeVisitor, TemplatedEmitter):
         
         self._emit_inner_params(template)
         
-        for package in range(self.env['max_package']):
-            self.env['package'] = package
+        def receive():
             self.env['depth'] = 0
-
-            self.emit("""
-            #if ${get_package} == ${package}
-            """)
-            self.indent()
             
             # Argument reception from the clients
             #   ex : #define ValueType_0_0 ValueType
@@ -341,12 +566,9 @@ class Generator(ast.NodeVisitor, TemplatedEmitter):
                 #undef ${name}_
                 #undef ${name}
                 """, name=param.name)
-            
-            
-            self.dedent()
-            self.emit("""
-            #endif
-            """)
+        
+        self._dispatch(self.env['get_package'], 'package',
+                                    range(self.env['max_package']), receive)
         
         self.setenv(oldenv)
     
@@ -379,75 +601,53 @@ class Generator(ast.NodeVisitor, TemplatedEmitter):
         oldenv = self.env
         self.env = self.env.copy()
         
-        for package in range(self.env['max_package']):
-            self.env['package'] = package
+        def instantiate():
+            package, depth = self.env['package'], self.env['depth']
             
+            # Signalize that this template was instantiated
             self.emit("""
-            #if ${get_package} == ${package}
-            """)
-            self.indent()
+            #define ${name}_${package}_${depth}_H 1
+            """, name=template.name)
             
             
-            for depth in range(self.env['max_depth']):
-                self.env['depth'] = depth
-                self.emit("""
-                #if ${get_depth} == ${depth}
-                """)
-                self.indent()
-                
-                # Signalize that this template was instantiated
-                self.emit("""
-                #define ${name}_${package}_${depth}_H 1
-                """, name=template.name)
-                
-                
-                # Argument reception
-                for param in template.params:
-                    mangled_name = "_".join(map(str, [param.name, package, depth]))
-                    
-                    # Make sure all arguments without default were passed
-                    if param.default is None:
-                        self.emit("""
-                        #if ! defined(${name})
-                        ${indent}#error "missing argument to template parameter ${name}"
-                        #endif
-                        """, name=mangled_name)
-                    
-                    # Or use default argument
-                    else:
-                        self.emit("""
-                        #if ! defined(${name})
-                        ${indent}#define ${name}${params} ${default}
-                        #endif
-                        """, name=mangled_name, params=fmt_arg_list(param.params),
-                                                            default=param.default)
-                
-                
-                # This is only included as a separate file in order to save lines.
-                self.emit("""
-                #include "${file}"
-                """, file=template.body_file)
-                
+            # Argument reception
+            for param in template.params:
+                mangled_name = "_".join(map(str, [param.name, package, depth]))
                 
-                # Argument cleanup
-                for param in template.params:
-                    mangled_name = "_".join(map(str, [param.name, package, depth]))
-                    
+                # Make sure all arguments without default were passed
+                if param.default is None:
                     self.emit("""
-                    #undef ${name}
+                    #if ! defined(${name})
+                    ${indent}#error "missing argument to template parameter ${name}"
+                    #endif
                     """, name=mangled_name)
                 
-                
-                self.dedent()
-                self.emit("""
-                #endif
-                """)
+                # Or use default argument
+                else:
+                    self.emit("""
+                    #if ! defined(${name})
+                    ${indent}#define ${name}${params} ${default}
+                    #endif
+                    """, name=mangled_name, params=fmt_arg_list(param.params),
+                                                        default=param.default)
             
-            self.dedent()
+            
+            # This is only included as a separate file in order to save lines.
             self.emit("""
-            #endif
-            """)
-
+            #include "${file}"
+            """, file=template.body_file)
+            
+            
+            # Argument cleanup
+            for param in template.params:
+                mangled_name = "_".join(map(str, [param.name, package, depth]))
+                
+                self.emit("""
+                #undef ${name}
+                """, name=mangled_name)
+        
+        self._dispatch_grid(instantiate, template.depths)
+        
         self.env = oldenv
     
     
@@ -483,56 +683,216 @@ class Generator(ast.NodeVisitor, TemplatedEmitter):
         oldenv = self.env
         self.env = self.env.copy()
         
-        for package in range(self.env['max_package']):
-            self.env['package'] = package
-            
-            self.emit("""
-            #if ${get_package} == ${package}
-            """)
-            self.indent()
-            
+        def bind():
+            # Undefine the inner parameters
+            for param in nest.template.params:
+                self.emit("""
+                #undef ${name}_
+                """, name=param.name)
             
-            for depth in range(self.env['max_depth']):
-                self.env['depth'] = depth
-                
+            for arg in nest.args:
+                params = fmt_arg_list(arg.params)
                 self.emit("""
-                #if ${get_depth} == ${depth}
-                """)
-                self.indent()
-                
-                # Undefine the inner parameters
-                for param in nest.template.params:
-                    self.emit("""
-                    #undef ${name}_
-                    """, name=param.name)
-                
-                for arg in nest.args:
-                    params = fmt_arg_list(arg.params)
-                    self.emit("""
-                    #define ${name}_${package}_${depth}${params} ${value}
-                    """, name=arg.name, params=params, value=arg.value)
-                
-                # Redefine the inner parameters
-                self._emit_inner_params(nest.template)
+                #define ${name}_${package}_${depth}${params} ${value}
+                """, name=arg.name, params=params, value=arg.value)
+            
+            # Redefine the inner parameters
+            self._emit_inner_params(nest.template)
+        
+        self._dispatch_grid(bind, self._template.depths)
+        
+        
+        self.emit("""
+        ${depth_incr}
+        #include "${file}"
+        ${depth_decr}
+        """, file=nest.template.content_file)
 
+        self.env = oldenv
 
-                self.dedent()
-                self.emit("""
-                #endif
-                """)
-            
-            self.dedent()
+
+
+class DispatchGenerator(Generator):
+    """Generate a program so that the size of the output grows with the
+    number of parameters of the templates, instead of with the number of
+    packages times the number of depths.
+    
+    The preprocessor can't compute the name of a macro to define, undefine
+    or test, so these directives are written once for each package and
+    depth in a slot file, which dispatches on the package and the depth
+    like the files of the Generator do. There is a slot file for each kind
+    of directive on a parameter, shared by all the templates with a
+    parameter of that name, and written in the slots directory of the
+    output. Default arguments and the arguments of nest statements are
+    specific to a template, so they are still defined for each package and
+    each depth.
+
+    The compiler doesn't use it: its output is smaller, but the slots make
+    it lex more tokens and include more files than the output of the
+    Generator when it is preprocessed (see scripts/bench_preprocess.py).
+    """
+    # Slot kinds, mapped to whether they depend on the depth and to their
+    # directive for a package and a depth.
+    SLOTS = {
+        'mark'    : (True, """
+                    #define ${name}_${package}_${depth}_H 1
+                    """),
+        'require' : (True, """
+                    #if ! defined(${name}_${package}_${depth})
+                    ${indent}#error "missing argument to template parameter ${name}_${package}_${depth}"
+                    #endif
+                    """),
+        'release' : (True, """
+                    #undef ${name}_${package}_${depth}
+                    """),
+        'receive' : (False, """
+                    #define ${name}_${package}_0${params} ${name}
+                    """),
+        'forget'  : (False, """
+                    #undef ${name}_${package}_0
+                    """),
+    }
+    
+    
+    def visit_Program(self, root, resolution):
+        self._slots = OrderedDict()
+        super().visit_Program(root, resolution)
+        self._emit_slots()
+    
+    
+    def _slotdir(self):
+        base = os.curdir if self.base is None else str(self.base)
+        return os.path.join(base, self.env['slots'])
+    
+    
+    def _emit_slot(self, template, kind, name, params=None):
+        """Emit the inclusion of a slot file from the files of a template.
+        The slots of a parameter receiving arguments depend on its arity.
+        """
+        # Names can't hold a dot, so the file names of the slots are unique.
+        filename = "{}.{}{}.h".format(name, kind,
+                                      "" if params is None else len(params))
+        self._slots[filename] = (kind, name, params)
+        self.emit("""
+        #include "${file}"
+        """, file=os.path.relpath(os.path.join(self._slotdir(), filename),
+                                                        template.directory))
+    
+    
+    def _emit_slots(self):
+        if not self._slots:
+            return
+        os.makedirs(self._slotdir(), exist_ok=True)
+        
+        oldenv = self.env
+        self.env = self.env.copy()
+        for filename, (kind, name, params) in self._slots.items():
+            bydepth, text = self.SLOTS[kind]
+            if params is not None:
+                params = ["_" + str(i) for i in range(len(params))]
+            params = fmt_arg_list(params)
+            emit_case = lambda: self.emit(text, name=name, params=params)
+            self.setstream(os.path.join(self._slotdir(), filename))
+            if bydepth:
+                self._dispatch_grid(emit_case)
+            else:
+                self._dispatch(self.env['get_package'], 'package',
+                                    range(self.env['max_package']), emit_case)
+        self.env = oldenv
+    
+    
+    def _emit_packagefile(self, template):
+        self._emit_inner_params(template)
+        self.emit("""
+        #if ${get_package} < ${max_package}
+        """)
+        self.indent()
+        for param in template.params:
+            self._emit_slot(template, 'receive', param.name, param.params)
+        
+        self.emit("""
+        #include "${file}"
+        """, file=template.content_file)
+        
+        for param in template.params:
+            self._emit_slot(template, 'forget', param.name)
             self.emit("""
-            #endif
-            """)
+            #undef ${name}_
+            #undef ${name}
+            """, name=param.name)
+        self.dedent()
+        self.emit("""
+        #endif
+        """)
+    
+    
+    def _emit_contentfile(self, template):
+        oldenv = self.env
+        self.env = self.env.copy()
+        
+        self.emit("""
+        #if ${get_package} < ${max_package} && ${get_depth} < ${max_depth}
+        """)
+        self.indent()
+        self._emit_slot(template, 'mark', template.name)
+        
+        for param in template.params:
+            if param.default is None:
+                self._emit_slot(template, 'require', param.name)
+            else:
+                self._dispatch_grid(lambda: self.emit("""
+                    #if ! defined(${name}_${package}_${depth})
+                    ${indent}#define ${name}_${package}_${depth}${params} ${default}
+                    #endif
+                    """, name=param.name, params=fmt_arg_list(param.params),
+                                    default=param.default), template.depths)
         
+        self.emit("""
+        #include "${file}"
+        """, file=template.body_file)
         
+        for param in template.params:
+            self._emit_slot(template, 'release', param.name)
+        self.dedent()
         self.emit("""
+        #endif
+        """)
+        
+        self.env = oldenv
+    
+    
+    def visit_NestStatement(self, nest):
+        oldenv = self.env
+        self.env = self.env.copy()
+        
+        self.emit("""
+        #if ${get_package} < ${max_package} && ${get_depth} < ${max_depth}
+        """)
+        self.indent()
+        for param in nest.template.params:
+            self.emit("""
+            #undef ${name}_
+            """, name=param.name)
+        
+        def bind():
+            for arg in nest.args:
+                self.emit("""
+                #define ${name}_${package}_${depth}${params} ${value}
+                """, name=arg.name, params=fmt_arg_list(arg.params),
+                                                            value=arg.value)
+        
+        if nest.args:
+            self._dispatch_grid(bind, self._template.depths)
+        
+        self._emit_inner_params(nest.template)
+        self.dedent()
+        self.emit("""
+        #endif
         ${depth_incr}
         #include "${file}"
         ${depth_decr}
         """, file=nest.template.content_file)
-
+        
         self.env = oldenv
 
 
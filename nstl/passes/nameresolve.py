@@ -1,10 +1,27 @@
 from .. import ast
 
 import sys
+import json
+import threading
+import multiprocessing
 from itertools import chain
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+
+def qualify(qualname, name):
+    """Return the fully qualified name of name inside of qualname."""
+    return qualname + '.' + name if qualname else name
 
 
 class Scope(dict):
+    """A scope binding names to declarations.
+    
+    Every scope keeps a flattened index of all the names reachable from it,
+    built the first time it is needed. A scope without bindings of its own
+    shares the index of its parent. Binding a name updates the indices of
+    the scope and of the nested scopes in which the name is not shadowed.
+    """
     def __init__(self, parent=None, name=None, *args, **kwargs):
         assert isinstance(parent, Scope) or parent is None
         
@@ -12,8 +29,18 @@ class Scope(dict):
         self.name = name
         self.parent = parent
         self.scopes = dict()
-        if parent is not None and self.name is not None:
-            self.parent.scopes.update({self.name:self})
+        if parent is None:
+            self.qualname = ''
+        elif name is None:
+            self.qualname = parent.qualname
+        else:
+            self.qualname = qualify(parent.qualname, name)
+        self._index = None
+        # The nested scopes whose index was built from the index of this one.
+        self._indexed = [ ]
+        if parent is not None:
+            if self.name is not None:
+                self.parent.scopes.update({self.name:self})
     
     
     def get_outer_scope(self, name):
@@ -30,25 +57,84 @@ class Scope(dict):
     def __contains__(self, name):
         """Return whether a name is reachable from the current scope.
         """
-        return (super().__contains__(name) or
-                                any(name in scope for scope in self.parents()))
+        return name in self.bindings()
     
     
     def __getitem__(self, name):
         """Return the object binding to a name, if the name is in scope.
         """
         try:
-            return super().__getitem__(name)
+            return self.bindings()[name]
         except KeyError:
-            if self.parent is None:
-                raise NameError("name {} is not in scope".format(name))
-            return self.parent.__getitem__(name)
+            raise NameError("name {} is not in scope".format(name)) from None
     
     
-    def __setitem__(self, *args, **kwargs):
+    def __setitem__(self, name, binding):
         """Bind a name to an object inside the current scope.
         """
-        return super().__setitem__(*args, **kwargs)
+        super().__setitem__(name, binding)
+        shared = self._index
+        if shared is None:
+            return
+        
+        index = shared
+        if self.parent is not None and shared is self.parent._index:
+            index = self._index = dict(shared)
+        index[name] = binding
+        
+        nested = list(self._indexed)
+        while nested:
+            scope = nested.pop()
+            if scope._index is None or dict.__contains__(scope, name):
+                continue
+            if scope._index is shared:
+                scope._index = index
+            elif scope._index is not index:
+                scope._index[name] = binding
+            nested.extend(scope._indexed)
+    
+    
+    def __delitem__(self, name):
+        super().__delitem__(name)
+        self._invalidate()
+    
+    
+    def update(self, *args, **kwargs):
+        for name, binding in dict(*args, **kwargs).items():
+            self[name] = binding
+    
+    
+    def bindings(self):
+        """Return a mapping from every name reachable from the current scope
+        to the object binding to it.
+        """
+        if self._index is not None:
+            return self._index
+        
+        unindexed = [self]
+        while unindexed[-1].parent is not None and \
+                                    unindexed[-1].parent._index is None:
+            unindexed.append(unindexed[-1].parent)
+        for scope in reversed(unindexed):
+            if scope.parent is None:
+                scope._index = dict(scope)
+            elif not scope:
+                scope._index = scope.parent._index
+            else:
+                scope._index = dict(scope.parent._index)
+                scope._index.update(scope)
+            if scope.parent is not None:
+                scope.parent._indexed.append(scope)
+        return self._index
+    
+    
+    def _invalidate(self):
+        nested = [self]
+        while nested:
+            scope = nested.pop()
+            scope._index = None
+            nested.extend(scope._indexed)
+            scope._indexed = [ ]
     
     
     def parents(self):
@@ -66,38 +152,88 @@ class Scope(dict):
             lead = lead + ' ' * 4
 
 
-def unique(seq):
-    seen = set()
-    seen_add = seen.add
-    return [x for x in seq if x not in seen and not seen_add(x)]
+class Resolution(object):
+    """The state of the name resolution of a single program.
+    
+    scope       the scope of the program
+    scopes      mapping from each namespace and template to its scope
+    index       mapping from the fully qualified name of each namespace and
+                template to its declaration
+    resolved    mapping from each identifier, qualified or not, to the
+                declaration it refers to
+    """
+    def __init__(self):
+        self.scope = Scope()
+        self.scopes = { }
+        self.index = OrderedDict()
+        self.resolved = { }
+        # The declarations already in each namespace while names are being
+        # collected, so reopening a namespace only appends the new ones.
+        self.declared = { }
 
 
 class NameCollector(ast.NodeTransformer):
-    def visit_Program(self, root, current_scope=Scope()):
-        new_root = self.generic_visit(root, current_scope)
-        new_root.decls = ast.Nodelist(unique(new_root.decls))
-        return new_root
+    """Bind the names declared in a program to their declarations.
     
-    def visit_Namespace(self, node, current_scope=Scope()):
+    The state of the resolution is kept in a Resolution set as the
+    resolution attribute of the context of the program, so a single
+    collector can be used for any number of programs. A namespace reopened
+    from a nested scope is also indexed under the name it is reopened with.
+    
+    Collecting the names of a program again, for example once it has been
+    loaded by the serialize module, binds the same names again.
+    """
+    def visit_Program(self, root, context):
+        state = context.resolution = Resolution()
+        self._collect(root, state, state.scope)
+        state.declared = None
+        return root
+    
+    def visit_Namespace(self, node, state, current_scope):
+        qualname = qualify(current_scope.qualname, node.name.value)
         if node.name.value in current_scope:
             already_there = current_scope[node.name.value]
-            current_scope = already_there.scope
-            for decl in node.decls:
-                already_there.decls.append(self.visit(decl, current_scope))
-            
-            already_there.decls = ast.Nodelist(unique(already_there.decls))
+            state.index.setdefault(qualname, already_there)
+            # In a program collected before, the namespace reopened from a
+            # nested scope is the one it was merged into, which is done.
+            if already_there is not node:
+                self._merge(already_there, node.decls, state,
+                                                state.scopes[already_there])
             return already_there
         else:
             current_scope[node.name.value] = node
-            node.a.scope = Scope(current_scope, node.name.value)
-            return self.generic_visit(node, node.scope)
+            scope = state.scopes[node] = Scope(current_scope, node.name.value)
+            state.index[qualname] = node
+            self._collect(node, state, scope)
+            return node
     
-    def visit_Template(self, node, current_scope=Scope()):
+    def visit_Template(self, node, state, current_scope):
         if node.name.value in current_scope:
             raise NameError("redefinition of template "+ node.name.value)
         current_scope[node.name.value] = node
-        node.a.scope = Scope(current_scope)
-        return self.generic_visit(node, node.scope)
+        state.index[qualify(current_scope.qualname, node.name.value)] = node
+        state.scopes[node] = Scope(current_scope)
+        # Nothing is declared inside the body of a template, so it is left
+        # alone. This spares parsing bodies that are parsed lazily.
+        return node
+    
+    def _collect(self, node, state, current_scope):
+        decls, node.decls = node.decls, ast.Nodelist()
+        state.declared[node] = set()
+        self._merge(node, decls, state, current_scope)
+    
+    def _merge(self, node, decls, state, current_scope):
+        """Visit declarations and append the resulting ones to the
+        declarations of a node, unless they are already there.
+        """
+        declared = state.declared.get(node)
+        if declared is None:
+            declared = state.declared[node] = set(node.decls)
+        for decl in decls:
+            decl = self.visit(decl, state, current_scope)
+            if decl not in declared:
+                declared.add(decl)
+                node.decls.append(decl)
 
 
 def merge_asts(*programs):
@@ -109,31 +245,201 @@ def merge_asts(*programs):
     return ast.Program(decls)
 
 
-class NameResolver(ast.NodeTransformer):
-    def visit_Program(self, root):
-        scope = Scope()
-        root = NameCollector().visit(root, scope)
-        return self.generic_visit(root, scope)
+def dump_index(index, buf=sys.stdout):
+    """Write an index of fully qualified names in the JSON format, as an
+    object mapping each name to the kind of its declaration.
+    """
+    json.dump(OrderedDict((name, type(decl).__name__.lower())
+                                    for name, decl in index.items()),
+                                                        buf, indent=4)
+    buf.write("\n")
+
+
+class NameResolver(ast.IterativeTransformer):
+    """Map each identifier of a program to the declaration it refers to, in
+    the resolved attribute of the Resolution of the program. The names are
+    collected first if the context of the program has no Resolution yet.
+    The resolver keeps no state of its own, so a single resolver can be
+    used for any number of programs.
+    
+    With more than one job, the templates are resolved by a pool of that
+    many worker processes once the rest of the program is resolved. The
+    workers are forked from the current process, so they are only used when
+    it can fork and runs no other thread. The results are recorded in the
+    order of the templates, so they do not depend on how the work was
+    scheduled, and those of a body are only recorded once the body is
+    parsed by the current process. With a single job, a body that is not
+    parsed yet is likewise resolved once it is parsed.
+    """
+    requires = (NameCollector,)
+    
+    def __init__(self, jobs=1):
+        self.jobs = jobs
     
-    def visit_Namespace(self, node, scope):
-        return self.generic_visit(node, node.scope)
+    def pre_visit_Program(self, root, context):
+        if getattr(context, 'resolution', None) is None:
+            NameCollector().visit(root, context)
+        return (context.resolution, context.resolution.scope)
     
-    def visit_Template(self, node, scope):
-        return self.generic_visit(node, node.scope)
+    def post_visit_Program(self, root, context):
+        if self.jobs > 1:
+            _resolve_templates_in_parallel(context.resolution, self.jobs)
+        return root
     
-    def visit_Identifier(self, node, current_scope):
-        if node.value not in current_scope:
+    def pre_visit_Namespace(self, node, state, scope):
+        return (state, state.scopes[node])
+    
+    def pre_visit_Template(self, node, state, scope):
+        if self.jobs > 1:
+            return ast.SKIP
+        scope = state.scopes[node]
+        # A body not parsed yet is left out of the children of the template,
+        # and resolved once it is parsed.
+        if node.c.pending('body'):
+            node.c.when_computed('body',
+                                 lambda body: self.visit(body, state, scope))
+        return (state, scope)
+    
+    def post_visit_Identifier(self, node, state, current_scope):
+        resolved = current_scope.bindings().get(node.value)
+        if resolved is None:
             raise NameError("unresolved reference {}".format(node.value))
-        node.a.resolved = current_scope[node.value]
+        state.resolved[node] = resolved
         return node
     
-    def visit_QualifiedIdentifier(self, node, current_scope):
+    def pre_visit_QualifiedIdentifier(self, node, state, current_scope):
         outer, *rest = list(reversed(node.quals))
-        scope = current_scope.get_outer_scope(outer.value)
+        decl = current_scope.bindings().get(outer.value)
+        if isinstance(decl, ast.Namespace):
+            scope = state.scopes[decl]
+        else:
+            scope = current_scope.get_outer_scope(outer.value)
+    
+        # Names are looked up by their fully qualified name first. Only
+        # names found in the parents of a qualifier are looked up in scopes.
         for qual in rest:
-            scope = scope[qual.value].scope
-        
-        self.visit(node.name, scope)
-        node.a.resolved = node.name.resolved
-        return node
+            decl = state.index.get(qualify(scope.qualname, qual.value))
+            if decl is None:
+                decl = scope[qual.value]
+            scope = state.scopes[decl]
+    
+        decl = state.index.get(qualify(scope.qualname, node.name.value))
+        if decl is None:
+            self.visit(node.name, state, scope)
+        else:
+            state.resolved[node.name] = decl
+        state.resolved[node] = state.resolved[node.name]
+        return ast.SKIP
+
+
+def _preorder(node):
+    """Return the nodes of a tree in pre-order."""
+    nodes, stack = [ ], [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Nodelist):
+            stack.extend(reversed(node))
+        else:
+            nodes.append(node)
+            stack.extend(reversed([child for name, child in node.children()]))
+    return nodes
+
+
+def canonical_names(index):
+    """Return a mapping from the id of each declaration in an index to the
+    first fully qualified name it is indexed under.
+    """
+    qualnames = { }
+    for qualname, decl in index.items():
+        qualnames.setdefault(id(decl), qualname)
+    return qualnames
+
+
+def _resolve_templates_in_parallel(state, jobs):
+    qualnames = canonical_names(state.index)
+    templates = [(qualname, decl) for qualname, decl in state.index.items()
+                    if isinstance(decl, ast.Template) and
+                                            qualnames[id(decl)] == qualname]
+    context = None
+    # Workers share the program with the parent process by forking it,
+    # which is unsafe when other threads are running.
+    if threading.active_count() == 1:
+        try:
+            context = multiprocessing.get_context('fork')
+        except ValueError:
+            pass
+    if context is None:
+        resolver = NameResolver()
+        for qualname, template in templates:
+            resolver.visit(template, state, None)
+        return
+    
+    chunksize = max(1, -(-len(templates) // (jobs * 4)))
+    chunks = [[qualname for qualname, decl in templates[i:i + chunksize]]
+                            for i in range(0, len(templates), chunksize)]
+    with ProcessPoolExecutor(jobs, mp_context=context,
+                    initializer=_init_worker, initargs=(state, qualnames)) \
+                                                                as executor:
+        results = chain.from_iterable(
+                        executor.map(_resolve_worker_templates, chunks))
+        for (qualname, template), resolved in zip(templates, results):
+            _record(state, template, [(ordinal, state.index[target])
+                                        for ordinal, target in resolved])
+
+
+def _outside_body(template):
+    """Return the nodes of a template outside of its body, in pre-order."""
+    return [template] + _preorder(template.name) + _preorder(template.params)
+
+
+def _record(state, template, resolved):
+    """Record the declarations the nodes of a template refer to, given as
+    a list of (position, declaration) pairs, where the position is that of
+    the node in the nodes outside of the body followed by the nodes of the
+    body, in pre-order. The nodes of a body that is not parsed yet are only
+    recorded once it is parsed, so it is not parsed here.
+    """
+    outside = _outside_body(template)
+    inside = [ ]
+    for ordinal, decl in resolved:
+        if ordinal < len(outside):
+            state.resolved[outside[ordinal]] = decl
+        else:
+            inside.append((ordinal - len(outside), decl))
+    
+    def record(body):
+        nodes = _preorder(body)
+        for ordinal, decl in inside:
+            state.resolved[nodes[ordinal]] = decl
+    if inside:
+        template.c.when_computed('body', record)
+
+
+# The resolution state of the program, along with the qualified names of
+# the declarations, in each worker process resolving templates.
+_worker_state = None
+
+def _init_worker(state, qualnames):
+    global _worker_state
+    _worker_state = (state, qualnames)
+
 
+def _resolve_worker_templates(names):
+    """Resolve the templates with the given fully qualified names. Return,
+    for each template, the list of the positions of its resolved nodes, as
+    expected by _record(), along with the fully qualified names of their
+    declarations.
+    """
+    state, qualnames = _worker_state
+    resolver = NameResolver()
+    results = [ ]
+    for name in names:
+        template = state.index[name]
+        resolver.visit(template, state, None)
+        nodes = _outside_body(template)
+        if template.body is not None:
+            nodes.extend(_preorder(template.body))
+        results.append([(ordinal, qualnames[id(state.resolved[node])])
+                                    for ordinal, node in enumerate(nodes)
+                                                if node in state.resolved])
+    return results
@@ -0,0 +1,149 @@
+from .. import ast
+
+
+
+def templates(program):
+    """Return the templates of a resolved program for which code is
+    generated, once each, in the order of their declaration.
+    """
+    found, seen = [ ], set()
+    pending = list(reversed(program.decls))
+    while pending:
+        decl = pending.pop()
+        if decl in seen:
+            continue
+        seen.add(decl)
+        # A namespace of an interface can be reopened with new templates.
+        if isinstance(decl, ast.Namespace):
+            pending.extend(reversed(decl.decls))
+        elif not decl.a.get('external', False):
+            found.append(decl)
+    return found
+
+
+def edges(template, resolution):
+    """Yield a pair (nested, target) for each template imported or nested
+    by a template, where nested is True for the templates it nests.
+    """
+    if template.body is None:
+        return
+    for stmnt in template.body.stmnts:
+        if isinstance(stmnt, ast.ImportStatement):
+            for ref in stmnt.refs:
+                yield False, resolution.resolved[ref]
+        elif isinstance(stmnt, ast.NestStatement):
+            yield True, resolution.resolved[stmnt.ref]
+
+
+def max_nest_depth(program, resolution):
+    """Return the length of the longest chain of nests between the templates
+    of a program, with its Resolution, following the templates they import
+    on the way, or None if a template can nest itself, directly or not.
+
+    A template nested n times is instantiated at the depth n, so the
+    program needs max_nest_depth(program, resolution) + 1 depths.
+    """
+    nodes = templates(program)
+    components = _components(nodes, lambda template: [target
+                                        for nested, target in edges(template, resolution)])
+    component = { }
+    for i, members in enumerate(components):
+        for template in members:
+            component[template] = i
+
+    # Components come after the ones they reach, so the longest chain
+    # starting from each of them is known when it is needed.
+    longest = [0] * len(components)
+    for i, members in enumerate(components):
+        for template in members:
+            for nested, target in edges(template, resolution):
+                j = component.get(target)
+                if j is None:
+                    continue
+                if j == i:
+                    if nested:
+                        return None
+                    continue
+                longest[i] = max(longest[i], longest[j] + nested)
+    return max(longest, default=0)
+
+
+def instantiation_depths(program, resolution, max_depth):
+    """Return a mapping from the templates of a program, with its Resolution,
+    to the sorted list of the depths, below max_depth, they can be
+    instantiated at.
+
+    Any template can be included at the depth 0. A template imported at a
+    depth is instantiated at that depth, and a template nested at a depth
+    is instantiated at the next one. The package is chosen by the clients,
+    so any template can be instantiated in any package. The clients of an
+    interface of the program can nest its templates at any depth, which
+    is not accounted for.
+    """
+    nodes = templates(program)
+    depths = {template: {0} for template in nodes}
+    pending = list(nodes)
+    while pending:
+        template = pending.pop()
+        for nested, target in edges(template, resolution):
+            reached = depths.get(target)
+            if reached is None:
+                continue
+            new = {depth + nested for depth in depths[template]
+                                if depth + nested < max_depth} - reached
+            if new:
+                reached |= new
+                pending.append(target)
+    return {template: sorted(reached) for template, reached in depths.items()}
+
+
+def _components(nodes, successors):
+    """Return the strongly connected components of a graph, as lists of
+    nodes, each one coming after all the components it reaches. Successors
+    that are not in nodes are ignored.
+    """
+    nodes = list(nodes)
+    known = set(nodes)
+    index, low = { }, { }
+    stack, onstack = [ ], set()
+    components = [ ]
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        onstack.add(root)
+        work = [(root, iter(successors(root)))]
+        while work:
+            node, remaining = work[-1]
+            for succ in remaining:
+                if succ not in known:
+                    continue
+                if succ not in index:
+                    index[succ] = low[succ] = len(index)
+                    stack.append(succ)
+                    onstack.add(succ)
+                    work.append((succ, iter(successors(succ))))
+                    break
+                if succ in onstack:
+                    low[node] = min(low[node], index[succ])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    members = [ ]
+                    while True:
+                        member = stack.pop()
+                        onstack.discard(member)
+                        members.append(member)
+                        if member is node:
+                            break
+                    components.append(members)
+    return components
+
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,133 @@
+from .. import ast
+
+
+
+def isfusable(pass_):
+    """Return whether a pass can share a tree walk with other passes.
+    Only passes written entirely with pre_visit_* and post_visit_* hooks can.
+    """
+    return (isinstance(pass_, ast.IterativeVisitor) and
+                not any(attr.startswith('visit_') for attr in dir(pass_)))
+
+
+
+class _FusedWalk(ast.IterativeTransformer):
+    """Run the hooks of several passes during a single walk of the tree.
+    Each pass gets its own arguments threaded through the walk. A pass that
+    skips a subtree is inactive in it, which is marked with None.
+    """
+    def __init__(self, passes):
+        self.passes = passes
+    
+    
+    def generic_pre_visit(self, node, *states):
+        hook = 'pre_visit_' + node.__class__.__name__
+        child_states = [ ]
+        descend = False
+        for pass_, args in zip(self.passes, states):
+            if args is None:
+                child_states.append(None)
+                continue
+            child_args = getattr(pass_, hook, pass_.generic_pre_visit)(node, *args)
+            if child_args is ast.SKIP:
+                child_states.append(None)
+            else:
+                child_states.append(args if child_args is None else child_args)
+                descend = True
+        return tuple(child_states) if descend else ast.SKIP
+    
+    
+    def generic_post_visit(self, node, *states):
+        hook = 'post_visit_' + node.__class__.__name__
+        for pass_, args in zip(self.passes, states):
+            if args is None:
+                continue
+            result = getattr(pass_, hook, pass_.generic_post_visit)(node, *args)
+            if isinstance(pass_, ast.IterativeTransformer):
+                node = result
+        return node
+    
+    
+    def run(self, root, context):
+        return self.visit(root, *((context,) for pass_ in self.passes))
+
+
+
+class Context(object):
+    """What the passes run over a program leave for the passes coming after
+    them, and for the code using the program, as attributes. For example,
+    the NameCollector sets the state of name resolution as the resolution
+    attribute. A context belongs to a single program, so the passes keep
+    no state of their own and can be used for any number of programs.
+    """
+    pass
+
+
+
+class PassManager(object):
+    """Run passes over a tree in an order satisfying their dependencies.
+    
+    A pass lists the classes of the passes that must have gone over the
+    whole tree before it starts in its requires attribute. Passes that are
+    ready at the same time and can be fused share a single walk of the tree.
+    Every pass visits the root of the tree with the Context of the program.
+    """
+    def __init__(self, *passes):
+        self.passes = list(passes)
+    
+    
+    def add(self, pass_):
+        self.passes.append(pass_)
+    
+    
+    def schedule(self):
+        """Return the list of groups of passes, in the order in which they
+        will run. The passes of a group share a single walk of the tree.
+        """
+        present = set(type(pass_) for pass_ in self.passes)
+        pending = list(self.passes)
+        done = set()
+        groups = [ ]
+        while pending:
+            ready = [pass_ for pass_ in pending
+                        if all(required in done or required not in present
+                                for required in getattr(pass_, 'requires', ()))]
+            if not ready:
+                raise ValueError("cyclic dependency between passes " +
+                        ", ".join(type(pass_).__name__ for pass_ in pending))
+            
+            if isfusable(ready[0]):
+                group = [pass_ for pass_ in ready if isfusable(pass_)]
+            else:
+                group = ready[:1]
+            
+            for pass_ in group:
+                pending.remove(pass_)
+            groups.append(group)
+            done.update(type(pass_) for pass_ in group)
+        return groups
+    
+    
+    def run(self, root, context=None):
+        """Run all the passes over a tree, with the given context or with a
+        new one, and return the resulting tree.
+        """
+        if context is None:
+            context = Context()
+        for group in self.schedule():
+            root = self.run_group(group, root, context)
+        return root
+    
+    
+    def run_group(self, group, root, context):
+        if len(group) > 1:
+            return _FusedWalk(group).run(root, context)
+        result = group[0].visit(root, context)
+        if isinstance(group[0], (ast.NodeTransformer, ast.IterativeTransformer)):
+            return result
+        return root
+
+
+
+if __name__ == "__main__":
+    pass
@@ -1,4 +1,5 @@
 from .. import ast
+from .nameresolve import NameCollector
 
 import os
 import itertools
@@ -6,12 +7,18 @@ import itertools
 
 
 class Path(object):
+    """A path made of a value appended to a parent path.
+    
+    Paths must not be modified once they are built. The string of a path is
+    computed the first time it is needed, from the string of its parent.
+    """
     def __init__(self, value, parent=None):
         if not (isinstance(parent, Path) or parent is None):
             raise TypeError(
                     "the parent of a path must either be a Path object or None")
         self.value = value
         self._parent = parent
+        self._str = None
     
     
     def xgetpath(self):
@@ -27,8 +34,17 @@ class Path(object):
     
     
     def __str__(self):
-        reversed_path = list(str(p.value) for p in self.xgetpath())
-        return os.sep.join(reversed(reversed_path))
+        if self._str is None:
+            if self._parent is None:
+                self._str = self._tail()
+            else:
+                self._str = str(self._parent) + os.sep + self._tail()
+        return self._str
+    
+    
+    def _tail(self):
+        """Return the part of the string of the path added to its parent."""
+        return str(self.value)
 
 
 
@@ -58,17 +74,60 @@ class Backtrack(Path):
         next(parents) # Skip ourselves, already included above
         for parent in parents:
             yield parent
+    
+    
+    def _tail(self):
+        return os.sep.join(itertools.repeat(str(self.value), self.i))
+
 
 
+class PathTable(object):
+    """Intern paths, so the path with a given value inside of a given parent
+    is only built once, along with its string. The declared attribute maps
+    each namespace and template to its path, once they are built by a
+    PathBuilder.
+    """
+    def __init__(self):
+        self._paths = { }
+        self.declared = { }
+    
+    
+    def path(self, value, parent=None):
+        key = (parent, value)
+        try:
+            return self._paths[key]
+        except KeyError:
+            path = self._paths[key] = Path(value, parent)
+            return path
 
-class PathBuilder(ast.NodeTransformer):
-    def visit_Namespace(self, node, parent=None):
-        node.a.path = Path(node.name.value, parent)
-        return self.generic_visit(node, node.path)
+
+
+class PathBuilder(ast.IterativeTransformer):
+    """Map each namespace and template to its path in the declared
+    attribute of the given table, which can be shared with the passes using
+    them, so the tree itself is left alone. The paths of the top-level
+    declarations are inside of the base path, if any.
+    """
+    requires = (NameCollector,)
+    
+    
+    def __init__(self, table=None, base=None):
+        self.table = PathTable() if table is None else table
+        self.base = base
+    
+    
+    def pre_visit_Program(self, root, context=None):
+        return (self.base,)
+    
+    
+    def pre_visit_Namespace(self, node, parent=None):
+        path = self.table.declared[node] = self.table.path(node.name.value,
+                                                                    parent)
+        return (path,)
     
     
-    def visit_Template(self, node, parent=None):
-        node.a.path = Path(node.name.value, parent)
-        return self.generic_visit(node, parent)
+    def pre_visit_Template(self, node, parent=None):
+        self.table.declared[node] = self.table.path(node.name.value, parent)
+        return ast.SKIP
 
 
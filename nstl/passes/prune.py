@@ -0,0 +1,82 @@
+from .. import ast
+from .nameresolve import NameResolver
+
+
+
+def reachable(resolution, roots):
+    """Return the set of the templates of a program reachable from the given
+    roots, which are fully qualified names of templates or namespaces, with
+    the Resolution of the program. A namespace stands for all the templates
+    declared inside of it. A template reaches the templates it imports or
+    nests.
+    """
+    index = resolution.index
+    pending = [ ]
+    for name in roots:
+        try:
+            pending.append(index[name])
+        except KeyError:
+            raise NameError("unknown root {}".format(name))
+    
+    live = set()
+    while pending:
+        decl = pending.pop()
+        if isinstance(decl, ast.Namespace):
+            pending.extend(decl.decls)
+            continue
+        if decl in live:
+            continue
+        live.add(decl)
+        if decl.body is None:
+            continue
+        for stmnt in decl.body.stmnts:
+            if isinstance(stmnt, ast.ImportStatement):
+                pending.extend(resolution.resolved[ref] for ref in stmnt.refs)
+            elif isinstance(stmnt, ast.NestStatement):
+                pending.append(resolution.resolved[stmnt.ref])
+    return live
+
+
+
+class Pruner(object):
+    """Remove the templates that are not reachable from a set of roots, and
+    the namespaces left empty, so no code is generated for them.
+    """
+    requires = (NameResolver,)
+    
+    
+    def __init__(self, roots):
+        self.roots = roots
+    
+    
+    def visit(self, root, context):
+        live = reachable(context.resolution, self.roots)
+        for node in _namespaces_inside_out(root):
+            node.decls = ast.Nodelist(decl for decl in node.decls
+                            if decl in live or
+                                isinstance(decl, ast.Namespace) and decl.decls)
+        return root
+
+
+
+def _namespaces_inside_out(root):
+    """Return the namespaces of a program, and the program itself, with the
+    namespaces nested in another one coming before it.
+    """
+    order, seen = [ ], set()
+    stack = [(root, False)]
+    while stack:
+        node, done = stack.pop()
+        if done:
+            order.append(node)
+        elif node not in seen:
+            seen.add(node)
+            stack.append((node, True))
+            stack.extend((decl, False) for decl in node.decls
+                                        if isinstance(decl, ast.Namespace))
+    return order
+
+
+
+if __name__ == "__main__":
+    pass
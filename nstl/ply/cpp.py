@@ -9,6 +9,15 @@
 # -----------------------------------------------------------------------------
 from __future__ import generators
 
+import sys
+
+# Some Python 3 compatibility shims
+if sys.version_info.major < 3:
+    STRING_TYPES = (str, unicode)
+else:
+    STRING_TYPES = str
+    xrange = range
+
 # -----------------------------------------------------------------------------
 # Default preprocessor lexer definitions.   These tokens are enough to get
 # a basic preprocessor working.   Other modules may import these if they want
@@ -388,19 +397,16 @@ class Preprocessor(object):
                     del macro.value[i-1]
                     macro.str_patch.append((argnum,i-1))
                     continue
-                # Concatenation
-                elif (i > 0 and macro.value[i-1].value == '##'):
-                    macro.patch.append(('c',argnum,i-1))
-                    del macro.value[i-1]
-                    continue
-                elif ((i+1) < len(macro.value) and macro.value[i+1].value == '##'):
+                # Concatenation.  The ## is kept and the tokens around it are
+                # pasted once the arguments have been substituted
+                elif (i > 0 and macro.value[i-1].value == '##') or \
+                        ((i+1) < len(macro.value) and macro.value[i+1].value == '##'):
                     macro.patch.append(('c',argnum,i))
-                    i += 1
-                    continue
                 # Standard expansion
                 else:
                     macro.patch.append(('e',argnum,i))
             elif macro.value[i].value == '##':
+                macro.value[i].paste = True
                 if macro.variadic and (i > 0) and (macro.value[i-1].value == ',') and \
                         ((i+1) < len(macro.value)) and (macro.value[i+1].type == self.t_ID) and \
                         (macro.value[i+1].value == macro.vararg):
@@ -416,7 +422,7 @@ class Preprocessor(object):
     # representing the replacement macro tokens
     # ----------------------------------------------------------------------
 
-    def macro_expand_args(self,macro,args):
+    def macro_expand_args(self,macro,args,expanded):
         # Make a copy of the macro token sequence
         rep = [copy.copy(_x) for _x in macro.value]
 
@@ -440,22 +446,81 @@ class Preprocessor(object):
         # has been sorted in reverse order of patch location since replacements will cause the
         # size of the replacement sequence to expand from the patch point.
         
-        expanded = { }
+        expanded_args = { }
         for ptype, argnum, i in macro.patch:
-            # Concatenation.   Argument is left unexpanded
+            # Concatenation.   Argument is left unexpanded, and an empty
+            # argument is replaced by a placemarker with an empty value
             if ptype == 'c':
-                rep[i:i+1] = args[argnum]
-            # Normal expansion.  Argument is macro expanded first
+                if args[argnum]:
+                    rep[i:i+1] = args[argnum]
+                else:
+                    rep[i] = copy.copy(rep[i])
+                    rep[i].value = ""
+            # Normal expansion.  Argument is macro expanded first, on its
+            # own.  The macros being expanded are only disabled while the
+            # replacement is rescanned, so the names of the ones which were
+            # already disabled where the argument appears are left alone
             elif ptype == 'e':
-                if argnum not in expanded:
-                    expanded[argnum] = self.expand_macros(args[argnum])
-                rep[i:i+1] = expanded[argnum]
+                if argnum not in expanded_args:
+                    expanded_args[argnum] = self.expand_macros(
+                        self.macro_paint(args[argnum],expanded,macro.name))
+                rep[i:i+1] = expanded_args[argnum]
 
         # Get rid of removed comma if necessary
         if comma_patch:
             rep = [_i for _i in rep if _i]
 
-        return rep
+        return self.macro_paste(rep)
+
+    # ----------------------------------------------------------------------
+    # macro_paint()
+    #
+    # Given the tokens of an argument of the macro with the given name, this
+    # method returns them with the names of the other macros being expanded
+    # marked so that they are never expanded.
+    # ----------------------------------------------------------------------
+
+    def macro_paint(self,tokens,expanded,name):
+        result = []
+        for tok in tokens:
+            if tok.type == self.t_ID and tok.value in expanded and tok.value != name:
+                tok = copy.copy(tok)
+                tok.noexpand = True
+            result.append(tok)
+        return result
+
+    # ----------------------------------------------------------------------
+    # macro_paste()
+    #
+    # Given the replacement of a macro with its arguments substituted,
+    # this method pastes the tokens on each side of the ## operators into
+    # single tokens, and removes the placemarkers left by empty arguments.
+    # Tokens which do not paste into a valid token are left separate.
+    # ----------------------------------------------------------------------
+
+    def macro_paste(self,rep):
+        result = []
+        pasting = False
+        for tok in rep:
+            if getattr(tok,'paste',False):
+                pasting = True
+                continue
+            if pasting and result:
+                text = str(result[-1].value) + str(tok.value)
+                pasted = self.tokenize(text) if text else []
+                if not text or len(pasted) == 1:
+                    # The pasted token is a new token, which may be expanded
+                    result[-1] = copy.copy(result[-1])
+                    result[-1].noexpand = False
+                    if pasted:
+                        result[-1].type = pasted[0].type
+                    result[-1].value = text
+                else:
+                    result.append(tok)
+            else:
+                result.append(tok)
+            pasting = False
+        return [_i for _i in result if _i.value != ""]
 
 
     # ----------------------------------------------------------------------
@@ -472,7 +537,7 @@ class Preprocessor(object):
         i = 0
         while i < len(tokens):
             t = tokens[i]
-            if t.type == self.t_ID:
+            if t.type == self.t_ID and not getattr(t,'noexpand',False):
                 if t.value in self.macros and t.value not in expanded:
                     # Yes, we found a macro match
                     expanded[t.value] = True
@@ -484,13 +549,13 @@ class Preprocessor(object):
                         for e in ex:
                             e.lineno = t.lineno
                         tokens[i:i+1] = ex
-                        i += len(ex)
+                        i += len(ex) - self.macro_tail(ex,expanded)
                     else:
                         # A macro with arguments
                         j = i + 1
                         while j < len(tokens) and tokens[j].type in self.t_WS:
                             j += 1
-                        if tokens[j].value == '(':
+                        if j < len(tokens) and tokens[j].value == '(':
                             tokcount,args,positions = self.collect_args(tokens[j:])
                             if not m.variadic and len(args) !=  len(m.arglist):
                                 self.error(self.source,t.lineno,"Macro %s requires %d arguments" % (t.value,len(m.arglist)))
@@ -510,14 +575,21 @@ class Preprocessor(object):
                                         del args[len(m.arglist):]
                                         
                                 # Get macro replacement text
-                                rep = self.macro_expand_args(m,args)
+                                rep = self.macro_expand_args(m,args,expanded)
                                 rep = self.expand_macros(rep,expanded)
                                 for r in rep:
                                     r.lineno = t.lineno
                                 tokens[i:j+tokcount] = rep
-                                i += len(rep)
+                                i += len(rep) - self.macro_tail(rep,expanded)
+                        else:
+                            # Not an invocation of the macro
+                            i += 1
                     del expanded[t.value]
                     continue
+                elif t.value in expanded:
+                    # The name of a macro being expanded is never expanded
+                    tokens[i] = copy.copy(t)
+                    tokens[i].noexpand = True
                 elif t.value == '__LINE__':
                     t.type = self.t_INTEGER
                     t.value = self.t_INTEGER_TYPE(t.lineno)
@@ -525,6 +597,22 @@ class Preprocessor(object):
             i += 1
         return tokens
 
+    # ----------------------------------------------------------------------
+    # macro_tail()
+    #
+    # Given the expansion of a macro, returns 1 if it ends with the name of
+    # a function-like macro which may still be expanded, in which case that
+    # name is rescanned along with the tokens following the expansion, and
+    # returns 0 otherwise.
+    # ----------------------------------------------------------------------
+
+    def macro_tail(self,rep,expanded):
+        if rep and rep[-1].type == self.t_ID and rep[-1].value not in expanded:
+            m = self.macros.get(rep[-1].value)
+            if m is not None and m.arglist:
+                return 1
+        return 0
+
     # ----------------------------------------------------------------------    
     # evalexpr()
     # 
@@ -567,7 +655,7 @@ class Preprocessor(object):
             if t.type == self.t_ID:
                 tokens[i] = copy.copy(t)
                 tokens[i].type = self.t_INTEGER
-                tokens[i].value = self.t_INTEGER_TYPE("0L")
+                tokens[i].value = self.t_INTEGER_TYPE("0")
             elif t.type == self.t_INTEGER:
                 tokens[i] = copy.copy(t)
                 # Strip off any trailing suffixes
@@ -579,9 +667,10 @@ class Preprocessor(object):
         expr = expr.replace("&&"," and ")
         expr = expr.replace("||"," or ")
         expr = expr.replace("!"," not ")
+        expr = expr.replace(" not ="," !=")
         try:
             result = eval(expr)
-        except StandardError:
+        except Exception:
             self.error(self.source,tokens[0].lineno,"Couldn't evaluate expression")
             result = 0
         return result
@@ -771,7 +860,7 @@ class Preprocessor(object):
     # ----------------------------------------------------------------------
 
     def define(self,tokens):
-        if isinstance(tokens,(str,unicode)):
+        if isinstance(tokens,STRING_TYPES):
             tokens = self.tokenize(tokens)
 
         linetok = tokens
@@ -0,0 +1,414 @@
+"""
+Compact binary serialization of nstl.ast trees.
+
+A serialized tree starts with a header made of MAGIC and the VERSION of the
+format, followed by the table of all the strings in the tree and the
+encoding of the root node. Integers are written as variable length
+quantities and every string is written once, as an index in the table.
+
+Nodes held as attributes are links rather than children: they are written
+as the index of the node in the order in which nodes are first written. A
+node appearing more than once in the tree is written the first time and
+referenced afterwards, so sharing survives a round trip. The bodies of
+templates are written in sections of their own, which are only decoded
+when they are first accessed if the tree is loaded lazily.
+
+The declarations the identifiers of a resolved tree refer to can be written
+along with it. They are links written at the end of the section holding
+the identifiers, so they are loaded along with the body they are in. The
+rest of the state of name resolution is rebuilt by running the
+NameCollector over the loaded tree, which does not decode the bodies.
+"""
+
+from . import ast
+from .passes import pathresolve
+
+import sys
+
+
+MAGIC = b'NSTLAST\0'
+VERSION = 2
+
+NODE_CLASSES = (
+    ast.Program, ast.Namespace, ast.Template, ast.ParameterDeclaration,
+    ast.ParameterIdentifier, ast.CompoundStatement, ast.NestStatement,
+    ast.ImportStatement, ast.ArgumentExpression, ast.RawExpression,
+    ast.QualifiedIdentifier, ast.Identifier,
+)
+
+# Children written in a section of their own, to be decoded on first access.
+LAZY_CHILDREN = {ast.Template: ('body',)}
+
+(NONE, FALSE, TRUE, INT, STR, TUPLE, LIST, NODE, NODELIST,
+    REF, LOCALREF, PATH, PATHREF, LAZY) = range(14)
+
+
+
+class SerializationError(Exception):
+    pass
+
+
+
+def dumps(root, resolved=None):
+    """Return the serialization of a tree as bytes. If resolved is given, it
+    maps identifiers to the declarations they refer to, like the resolved
+    attribute of a nameresolve.Resolution, and the declarations the
+    identifiers of the tree refer to are written too.
+    """
+    return Encoder(resolved).encode(root)
+
+
+def dump(root, file, resolved=None):
+    """Write the serialization of a tree to a binary file."""
+    file.write(dumps(root, resolved))
+
+
+def loads(data, lazy=True, resolved=None):
+    """Return the tree serialized in bytes. If lazy is True, the bodies of
+    templates are only decoded when they are first accessed. If resolved is
+    given, the identifiers are mapped in it to the declarations they refer
+    to as they are decoded.
+    """
+    return Decoder(data, resolved).decode(lazy)
+
+
+def load(file, lazy=True, resolved=None):
+    """Return the tree serialized in a binary file."""
+    return loads(file.read(), lazy, resolved)
+
+
+
+def _write_uint(buf, n):
+    while n > 0x7f:
+        buf.append((n & 0x7f) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+
+class _Section(object):
+    """The nodes and paths written so far in an independently decodable
+    part of the output.
+    """
+    def __init__(self):
+        self.buf = bytearray()
+        self.nodes = { }
+        self.paths = { }
+        # The local index of each identifier along with its declaration.
+        self.resolved = [ ]
+
+
+
+class Encoder(object):
+    def __init__(self, resolved=None):
+        self._strings = { }
+        self._eager = { }
+        self._resolved = { } if resolved is None else resolved
+
+
+    def encode(self, root):
+        self._number(root)
+        section = self._root_section = _Section()
+        self._value(section, root, child=True)
+        self._resolutions(section)
+
+        out = bytearray(MAGIC)
+        _write_uint(out, VERSION)
+        _write_uint(out, len(self._strings))
+        for string in self._strings:
+            data = string.encode('utf-8')
+            _write_uint(out, len(data))
+            out += data
+        out += section.buf
+        return bytes(out)
+
+
+    def _number(self, root):
+        """Number the nodes outside of lazy sections in the order in which
+        they will be written, so links can refer to nodes written later.
+        """
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, ast.Nodelist):
+                stack.extend(reversed(node))
+                continue
+            if id(node) in self._eager:
+                continue
+            self._eager[id(node)] = len(self._eager)
+            lazy = LAZY_CHILDREN.get(type(node), ())
+            children = [node.c[name] for name in node.c if name not in lazy]
+            stack.extend(reversed([child for child in children
+                            if isinstance(child, (ast.Node, ast.Nodelist))]))
+
+
+    def _string(self, string):
+        try:
+            return self._strings[string]
+        except KeyError:
+            index = self._strings[string] = len(self._strings)
+            return index
+
+
+    def _value(self, section, value, child=False):
+        buf = section.buf
+        if value is None:
+            buf.append(NONE)
+        elif value is True or value is False:
+            buf.append(TRUE if value else FALSE)
+        elif isinstance(value, int):
+            buf.append(INT)
+            _write_uint(buf, value << 1 if value >= 0 else (-value << 1) - 1)
+        elif isinstance(value, str):
+            buf.append(STR)
+            _write_uint(buf, self._string(value))
+        elif isinstance(value, ast.Nodelist):
+            buf.append(NODELIST)
+            _write_uint(buf, len(value))
+            for node in value:
+                self._value(section, node, child)
+        elif isinstance(value, (tuple, list)):
+            buf.append(TUPLE if isinstance(value, tuple) else LIST)
+            _write_uint(buf, len(value))
+            for item in value:
+                self._value(section, item)
+        elif isinstance(value, ast.Node):
+            if child:
+                self._node(section, value)
+            else:
+                self._link(section, value)
+        elif isinstance(value, pathresolve.Path):
+            self._path(section, value)
+        else:
+            raise SerializationError(
+                        "can't serialize a value of type " + type(value).__name__)
+
+
+    def _link(self, section, node):
+        try:
+            index = self._eager[id(node)]
+        except KeyError:
+            raise SerializationError(
+                    "link to a {} outside of the tree or inside of a template body"
+                                                .format(type(node).__name__))
+        section.buf.append(REF)
+        _write_uint(section.buf, index)
+
+
+    def _node(self, section, node):
+        buf = section.buf
+        if id(node) in section.nodes:
+            buf.append(LOCALREF)
+            _write_uint(buf, section.nodes[id(node)])
+            return
+        if section is not self._root_section and id(node) in self._eager:
+            # A node shared between a template body and the rest of the tree.
+            self._link(section, node)
+            return
+        section.nodes[id(node)] = len(section.nodes)
+        if node in self._resolved:
+            section.resolved.append((section.nodes[id(node)],
+                                                    self._resolved[node]))
+
+        try:
+            tag = NODE_CLASSES.index(type(node))
+        except ValueError:
+            raise SerializationError(
+                        "can't serialize a node of type " + type(node).__name__)
+        buf.append(NODE)
+        _write_uint(buf, tag)
+
+        _write_uint(buf, len(node.a))
+        for name, value in node.a.items():
+            _write_uint(buf, self._string(name))
+            self._value(section, value)
+
+        lazy = LAZY_CHILDREN.get(type(node), ())
+        # The items of the children leave out the bodies not parsed yet,
+        # which must be parsed to be written.
+        children = [(name, node.c[name]) for name in node.c]
+        _write_uint(buf, len(children))
+        for name, value in children:
+            _write_uint(buf, self._string(name))
+            if name in lazy and value is not None:
+                body = _Section()
+                self._value(body, value, child=True)
+                self._resolutions(body)
+                buf.append(LAZY)
+                _write_uint(buf, len(body.buf))
+                buf += body.buf
+            else:
+                self._value(section, value, child=True)
+
+
+    def _resolutions(self, section):
+        """Write the declarations the identifiers of a section refer to."""
+        _write_uint(section.buf, len(section.resolved))
+        for index, decl in section.resolved:
+            _write_uint(section.buf, index)
+            self._link(section, decl)
+
+
+    def _path(self, section, path):
+        buf = section.buf
+        if id(path) in section.paths:
+            buf.append(PATHREF)
+            _write_uint(buf, section.paths[id(path)])
+            return
+        if type(path) is not pathresolve.Path:
+            raise SerializationError(
+                        "can't serialize a path of type " + type(path).__name__)
+        buf.append(PATH)
+        self._value(section, path._parent)
+        self._value(section, path.value)
+        section.paths[id(path)] = len(section.paths)
+
+
+
+class Decoder(object):
+    def __init__(self, data, resolved=None):
+        self._data = memoryview(data)
+        self._resolved = resolved
+        self._strings = [ ]
+        self._eager = [ ]
+        self._links = [ ]
+        self._bodies = [ ]
+
+
+    def decode(self, lazy=True):
+        data = self._data
+        if bytes(data[:len(MAGIC)]) != MAGIC:
+            raise SerializationError("not a serialized nstl tree")
+        pos = len(MAGIC)
+        version, pos = self._uint(pos)
+        if version != VERSION:
+            raise SerializationError(
+                "unsupported serialization format version {}".format(version))
+
+        count, pos = self._uint(pos)
+        for i in range(count):
+            length, pos = self._uint(pos)
+            self._strings.append(
+                    sys.intern(str(data[pos:pos + length], 'utf-8')))
+            pos += length
+
+        section = ([ ], [ ])
+        root, pos = self._value(section, pos, self._eager)
+        for bucket, name, index in self._links:
+            bucket[name] = self._eager[index]
+        self._links = None
+        self._resolutions(section, pos)
+        
+        # Bodies may link to any node of the tree, so they are decoded last.
+        if not lazy:
+            for bucket, name in self._bodies:
+                bucket[name]
+        self._bodies = None
+        return root
+
+
+    def _uint(self, pos):
+        data = self._data
+        n = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            n |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return n, pos
+            shift += 7
+
+
+    def _value(self, section, pos, numbered, bucket=None, name=None):
+        tag = self._data[pos]
+        pos += 1
+        if tag == NONE:
+            return None, pos
+        elif tag == FALSE:
+            return False, pos
+        elif tag == TRUE:
+            return True, pos
+        elif tag == INT:
+            n, pos = self._uint(pos)
+            return (n >> 1) ^ -(n & 1), pos
+        elif tag == STR:
+            index, pos = self._uint(pos)
+            return self._strings[index], pos
+        elif tag in (TUPLE, LIST, NODELIST):
+            count, pos = self._uint(pos)
+            items = [ ]
+            for i in range(count):
+                item, pos = self._value(section, pos, numbered)
+                items.append(item)
+            return {TUPLE: tuple, LIST: list,
+                    NODELIST: ast.Nodelist}[tag](items), pos
+        elif tag == NODE:
+            return self._node(section, pos, numbered)
+        elif tag == LOCALREF:
+            index, pos = self._uint(pos)
+            return section[0][index], pos
+        elif tag == REF:
+            index, pos = self._uint(pos)
+            if index < len(self._eager):
+                return self._eager[index], pos
+            if self._links is None or bucket is None:
+                raise SerializationError(
+                        "invalid link to node {} at offset {}".format(index, pos))
+            # The node linked to is not decoded yet.
+            self._links.append((bucket, name, index))
+            return None, pos
+        elif tag == PATH:
+            parent, pos = self._value(section, pos, numbered)
+            value, pos = self._value(section, pos, numbered)
+            path = pathresolve.Path(value, parent)
+            section[1].append(path)
+            return path, pos
+        elif tag == PATHREF:
+            index, pos = self._uint(pos)
+            return section[1][index], pos
+        elif tag == LAZY:
+            length, pos = self._uint(pos)
+            start = pos
+            def decode_body():
+                section = ([ ], [ ])
+                body, end = self._value(section, start, None)
+                self._resolutions(section, end)
+                return body
+            self._bodies.append((bucket, name))
+            return ast.Lazy(decode_body), pos + length
+        raise SerializationError("invalid tag {} at offset {}".format(tag, pos - 1))
+
+
+    def _resolutions(self, section, pos):
+        """Read the declarations the identifiers of a section refer to."""
+        count, pos = self._uint(pos)
+        for i in range(count):
+            index, pos = self._uint(pos)
+            decl, pos = self._value(section, pos, None)
+            if self._resolved is not None:
+                self._resolved[section[0][index]] = decl
+        return pos
+
+
+    def _node(self, section, pos, numbered):
+        index, pos = self._uint(pos)
+        cls = NODE_CLASSES[index]
+        node = cls.__new__(cls)
+        ast.Node.__init__(node)
+        section[0].append(node)
+        if numbered is not None:
+            numbered.append(node)
+
+        for bucket in (node.a, node.c):
+            count, pos = self._uint(pos)
+            for i in range(count):
+                index, pos = self._uint(pos)
+                name = self._strings[index]
+                bucket[name], pos = self._value(section, pos, numbered,
+                                                                bucket, name)
+        return node, pos
+
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,109 @@
+from . import ast
+
+import sys
+import json
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+
+class Statistics(object):
+    """Record the time and memory spent in each phase of a compilation,
+    along with counts of the things that were processed.
+    
+    Peak memory is only measured when trace_memory is True, in which case
+    tracemalloc must be running while the phases execute.
+    """
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.phases = OrderedDict()
+        self.counts = OrderedDict()
+    
+    
+    @contextmanager
+    def phase(self, name):
+        """Measure the execution of the body of a with statement. The
+        measurements of phases with the same name are accumulated.
+        """
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            record = self.phases.setdefault(name,
+                            OrderedDict(wall=0.0, cpu=0.0, peak_memory=None))
+            record['wall'] += time.perf_counter() - wall
+            record['cpu'] += time.process_time() - cpu
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                record['peak_memory'] = max(peak, record['peak_memory'] or 0)
+    
+    
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+    
+    
+    def counting(self, name, func, accept=None):
+        """Return a function forwarding to func and counting the calls that
+        did not return None, nor a result for which accept returns False.
+        """
+        def counted(*args, **kwargs):
+            result = func(*args, **kwargs)
+            if result is not None and (accept is None or accept(result)):
+                self.counts[name] = self.counts.get(name, 0) + 1
+            return result
+        return counted
+    
+    
+    def count_nodes(self, root):
+        """Count the nodes and templates of a tree. The nodes of the bodies
+        that are not parsed yet are not counted, so counting them parses
+        nothing.
+        """
+        counter = _NodeCounter()
+        counter.visit(root)
+        self.count('nodes', counter.nodes)
+        self.count('templates', counter.templates)
+    
+    
+    def show(self, buf=sys.stdout):
+        buf.write("{:<32} {:>10} {:>10} {:>12}\n".format(
+                                    "phase", "wall (s)", "cpu (s)", "peak (KiB)"))
+        for name, record in self.phases.items():
+            peak = record['peak_memory']
+            buf.write("{:<32} {:>10.4f} {:>10.4f} {:>12}\n".format(name,
+                        record['wall'], record['cpu'],
+                        "-" if peak is None else "{:.1f}".format(peak / 1024)))
+        buf.write("\n")
+        for name, n in self.counts.items():
+            buf.write("{:<32} {:>10}\n".format(name, n))
+    
+    
+    def dump(self, buf=sys.stdout):
+        json.dump(OrderedDict(phases=self.phases, counts=self.counts),
+                                                                buf, indent=4)
+        buf.write("\n")
+
+
+
+class _NodeCounter(ast.IterativeVisitor):
+    def __init__(self):
+        self.nodes = 0
+        self.templates = 0
+    
+    
+    def generic_pre_visit(self, node):
+        self.nodes += 1
+    
+    
+    def pre_visit_Template(self, node):
+        self.nodes += 1
+        self.templates += 1
+
+
+
+if __name__ == "__main__":
+    pass
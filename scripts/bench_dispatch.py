@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Benchmark the size of the output of the Generator and of the
+DispatchGenerator, testing each package and depth in turn or with trees of
+range tests, and the time the C preprocessor spends on it.
+
+A program made of namespaces holding templates which import and nest the
+first template of their namespace is generated in each way, for as many
+depths as its nests need, as with --max-depth auto, and for every depth or
+only at the depths each template can be instantiated at with
+--prune-depths. A translation unit instantiating every template in every
+package is then preprocessed by the C preprocessor, which is given by the
+CPP environment variable and defaults to cpp. The preprocessed outputs
+must all be the same.
+"""
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+from benchutil import CONCAT, make_template, generate, write_support
+from nstl import ast
+from nstl.passes import codegen
+
+
+NAMESPACES = 4
+TEMPLATES = 25
+REPEAT = 3
+
+CPP = os.environ.get('CPP', 'cpp')
+
+GENERATORS = [
+    ("Generator", codegen.Generator, { }),
+    ("Generator --prune-depths", codegen.Generator, {'prune': True}),
+    ("Generator --if-tree", codegen.Generator, {'tree': True}),
+    ("DispatchGenerator", codegen.DispatchGenerator, { }),
+    ("DispatchGenerator --if-tree", codegen.DispatchGenerator, {'tree': True}),
+]
+
+
+def make_program():
+    namespaces = [ ]
+    for n in range(NAMESPACES):
+        templates = [make_template("t0", [("U", None, "int"),
+                                          ("G", ("x",), "(x)")],
+                                   "static inline U_ G_(t0) (U_ x);")]
+        for t in range(1, TEMPLATES):
+            name = "t{}".format(t)
+            templates.append(make_template(name, [("T", None, None),
+                                                  ("F", ("x",), "(x)")],
+                        "static inline T_ F_(%s) (T_ x);" % name,
+                        "t0", [("U", "long")]))
+        namespaces.append(ast.Namespace(ast.Identifier("ns{}".format(n)),
+                                                                templates))
+    return ast.Program([ast.Namespace(ast.Identifier("bench"), namespaces)])
+
+
+def write_unit(directory, env):
+    """Write the translation unit instantiating every template but the
+    first of each namespace, in every package.
+    """
+    unit = os.path.join(directory, "unit.c")
+    with open(unit, 'w') as file:
+        file.write(CONCAT)
+        file.write("#define NSTL_DEPTH 0\n")
+        for package in range(env['max_package']):
+            file.write("#undef NSTL_PACKAGE\n")
+            file.write("#define NSTL_PACKAGE {}\n".format(package))
+            for n in range(NAMESPACES):
+                for t in range(1, TEMPLATES):
+                    file.write("#define T int\n#define F(x) x\n")
+                    file.write('#include "bench/ns{}/t{}.h"\n'.format(n, t))
+    return unit
+
+
+def bench(Generator, options):
+    best = None
+    with tempfile.TemporaryDirectory() as directory:
+        outputdir = os.path.join(directory, "out")
+        generator, program, resolution = generate(make_program(), Generator,
+                                                        options, outputdir)
+        written = sum(map(os.path.getsize, generator.filenames))
+        write_support(directory, generator.env)
+        unit = write_unit(directory, generator.env)
+        command = [CPP, "-P", "-I", outputdir, "-I", directory, unit]
+        for i in range(REPEAT):
+            start = time.perf_counter()
+            result = subprocess.run(command, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE,
+                                    universal_newlines=True, check=True)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+    output = " ".join(result.stdout.split())
+    return len(generator.filenames), written, best, output
+
+
+if __name__ == "__main__":
+    outputs = [ ]
+    for name, Generator, options in GENERATORS:
+        files, written, elapsed, output = bench(Generator, options)
+        outputs.append(output)
+        print("{:28} {} files, {:.2f} MB, preprocessed in {:.3f} s".format(
+                                    name, files, written / 1e6, elapsed))
+    if any(output != outputs[0] for output in outputs):
+        sys.exit("the preprocessed outputs differ")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Benchmark the throughput of code generation, in MB/s.
+
+A program made of namespaces holding templates which import and nest the
+first template of their namespace is lowered, then emitted to a temporary
+directory. The throughput is the number of bytes written divided by the
+time spent emitting them.
+"""
+
+import os
+import time
+import tempfile
+
+from benchutil import make_template, resolve
+from nstl import ast
+from nstl.passes import codegen
+
+
+NAMESPACES = 10
+TEMPLATES = 40
+REPEAT = 3
+
+PARAMS = [("T", None, None), ("F", ("x",), "(x)")]
+TEXT = "static inline T_ F_(%s) (T_ x) { return x; }"
+
+
+def make_program():
+    namespaces = [ ]
+    for n in range(NAMESPACES):
+        templates = [make_template("t0", PARAMS, TEXT % "t0")]
+        for t in range(1, TEMPLATES):
+            name = "t{}".format(t)
+            templates.append(make_template(name, PARAMS, TEXT % name, "t0",
+                                                            [("T", "int")]))
+        namespaces.append(ast.Namespace(ast.Identifier("ns{}".format(n)),
+                                                                templates))
+    return ast.Program([ast.Namespace(ast.Identifier("bench"), namespaces)])
+
+
+def bench():
+    best = None
+    for i in range(REPEAT):
+        with tempfile.TemporaryDirectory() as outputdir:
+            program, resolution, paths, base = resolve(make_program(),
+                                                            outputdir)
+
+            # Lowering is done up front, so only emission is measured.
+            generator = codegen.Generator(paths=paths, base=base)
+            program = codegen._AstPreparator(paths,
+                            resolution).visit(program, base)
+            generator._makedirs(program)
+            start = time.perf_counter()
+            generator.generic_visit(program)
+            generator.close()
+            elapsed = time.perf_counter() - start
+            written = sum(map(os.path.getsize, generator.filenames))
+        if best is None or elapsed < best[0]:
+            best = (elapsed, written, len(generator.filenames))
+    return best
+
+
+if __name__ == "__main__":
+    elapsed, written, files = bench()
+    print("{} files, {:.2f} MB in {:.3f} s: {:.2f} MB/s".format(
+            files, written / 1e6, elapsed, written / 1e6 / elapsed))
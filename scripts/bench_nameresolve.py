@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Benchmark name resolution against the nesting depth of namespaces.
+
+Every program has a single template at the innermost level of a chain of
+nested namespaces, whose body refers to templates declared at the
+outermost level. Resolving the references should not get slower as the
+chain gets deeper.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                os.pardir))
+from nstl import ast
+from nstl.passes import nameresolve, passmanager
+
+
+DEPTHS = (1, 4, 16, 64, 128)
+REFERENCES = 500
+REPEAT = 5
+
+
+def make_program(depth, references):
+    body = ast.CompoundStatement([
+        ast.ImportStatement([ast.Identifier("outer{}".format(i % 10))], [ ])
+        for i in range(references)
+    ])
+    decls = [ast.Template(ast.Identifier("inner"), [ ], body)]
+    for level in reversed(range(depth)):
+        decls = [ast.Namespace(ast.Identifier("ns{}".format(level)), decls)]
+    outer = [ast.Template(ast.Identifier("outer{}".format(i)), [ ],
+                                        ast.CompoundStatement([ ]))
+             for i in range(10)]
+    return ast.Program(outer + decls)
+
+
+def bench(depth):
+    best = None
+    for i in range(REPEAT):
+        context = passmanager.Context()
+        program = nameresolve.NameCollector().visit(
+                                        make_program(depth, REFERENCES), context)
+        start = time.perf_counter()
+        nameresolve.NameResolver().visit(program, context)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    print("{:>6} {:>12} {:>14}".format("depth", "time (ms)", "per ref (us)"))
+    for depth in DEPTHS:
+        elapsed = bench(depth)
+        print("{:>6} {:>12.2f} {:>14.2f}".format(
+                        depth, elapsed * 1e3, elapsed / REFERENCES * 1e6))
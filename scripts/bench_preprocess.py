@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Benchmark the cost of preprocessing the output of code generation, with
+the preprocessor bundled in nstl.ply.cpp.
+
+A program made of a leaf template, a template nesting it and templates
+importing and nesting the latter is generated by the Generator, for as
+many depths as its nests need, for all of them or only at the depths each
+template can be instantiated at, or with trees of range tests, and by the
+DispatchGenerator. For the first and the last package and for each depth,
+a translation unit instantiating every template which can be instantiated
+at that depth is preprocessed, counting the tokens lexed, including those
+of the skipped groups, the tokens output, the macros expanded, the #if and
+#elif expressions evaluated and the files included. Unlike the time, the
+counts don't depend on the machine. The preprocessed outputs of each
+package and depth must be the same for all the generators, and the same as
+the output of the C preprocessor given by the CPP environment variable,
+which defaults to cpp, if it is installed.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+from collections import OrderedDict
+
+from benchutil import CONCAT, make_template, generate, write_support
+from nstl import ast
+from nstl.ply import lex, cpp
+from nstl.passes import codegen, nestgraph
+
+
+TEMPLATES = 10
+REPEAT = 3
+
+CPP = shutil.which(os.environ.get('CPP', 'cpp'))
+
+GENERATORS = [
+    ("Generator", codegen.Generator, { }),
+    ("Generator --prune-depths", codegen.Generator, {'prune': True}),
+    ("Generator --if-tree", codegen.Generator, {'tree': True}),
+    ("DispatchGenerator", codegen.DispatchGenerator, { }),
+]
+
+COUNTS = ('tokens lexed', 'tokens output', 'macro expansions',
+          '#if evaluations', 'files included')
+
+
+
+class _Macros(dict):
+    """The macros of a CountingPreprocessor. The preprocessor subscripts
+    them to expand a macro, and to save __FILE__ around an #include.
+    """
+    lookups = 0
+
+    def __getitem__(self, name):
+        self.lookups += 1
+        return dict.__getitem__(self, name)
+
+
+
+class CountingPreprocessor(cpp.Preprocessor):
+    """A Preprocessor counting what it does in counts."""
+    def __init__(self, lexer):
+        self.counts = OrderedDict((name, 0) for name in COUNTS)
+        super().__init__(lexer)
+        self.macros = _Macros(self.macros)
+
+
+    def run(self, input, source):
+        """Preprocess input and return the values of the tokens output."""
+        self.parse(input, source)
+        output = [ ]
+        while True:
+            tok = self.token()
+            if not tok:
+                break
+            if tok.type not in self.t_WS:
+                output.append(str(tok.value))
+        self.counts['tokens output'] = len(output)
+        self.counts['macro expansions'] = (self.macros.lookups -
+                                            self.counts['files included'])
+        return output
+
+
+    def group_lines(self, input):
+        for line in super().group_lines(input):
+            self.counts['tokens lexed'] += len(line)
+            yield line
+
+
+    def evalexpr(self, tokens):
+        self.counts['#if evaluations'] += 1
+        return super().evalexpr(tokens)
+
+
+    def include(self, tokens):
+        self.counts['files included'] += 1
+        return super().include(tokens)
+
+
+
+def make_program():
+    # The nested templates are instantiated without a T of their own, which
+    # cpp rejects unless T has a default.
+    params = [("T", None, "int"), ("F", ("x",), "(x)")]
+    text = "static inline T_ F_(%s) (T_ x);"
+    templates = [make_template("t0", params, text % "t0"),
+                 make_template("t1", params, text % "t1", "t0",
+                                                        [("T", "long")])]
+    for t in range(2, TEMPLATES):
+        name = "t{}".format(t)
+        templates.append(make_template(name, params, text % name, "t1",
+                                                        [("T", "long")]))
+    return ast.Program([ast.Namespace(ast.Identifier("bench"), templates)])
+
+
+def instantiable(program, resolution, max_depth):
+    """Return the names of the templates which can be instantiated at each
+    depth.
+    """
+    depths = nestgraph.instantiation_depths(program, resolution, max_depth)
+    return [[template.name.value for template in depths
+                                        if depth in depths[template]]
+            for depth in range(max_depth)]
+
+
+def make_unit(package, depth, names):
+    """Return a translation unit instantiating the templates with the given
+    names in a package, at a depth.
+    """
+    unit = [CONCAT]
+    unit.append("#define NSTL_PACKAGE {}\n".format(package))
+    unit.append("#define NSTL_DEPTH {}\n".format(depth))
+    for name in names:
+        unit.append("#define T int\n#define F(x) x\n")
+        unit.append('#include "bench/{}.h"\n'.format(name))
+    return "".join(unit)
+
+
+def reference(unit, paths):
+    """Return the output of the C preprocessor on a translation unit, as the
+    values of the tokens output, without whitespace.
+    """
+    command = [CPP, "-P"]
+    for path in paths:
+        command += ["-I", path]
+    output = subprocess.run(command + ["-"], input=unit, check=True,
+                        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                        universal_newlines=True).stdout
+    return "".join(output.split())
+
+
+def bench(Generator, options):
+    """Return a list of (package, depth, counts, time, output) for each unit
+    preprocessed.
+    """
+    results = [ ]
+    lexer = lex.lex(module=cpp)
+    with tempfile.TemporaryDirectory() as directory:
+        outputdir = os.path.join(directory, "out")
+        generator, program, resolution = generate(make_program(), Generator,
+                                                        options, outputdir)
+        write_support(directory, generator.env)
+        for package in (0, generator.env['max_package'] - 1):
+            for depth, names in enumerate(instantiable(program, resolution,
+                                                generator.env['max_depth'])):
+                unit = make_unit(package, depth, names)
+                best = None
+                for i in range(REPEAT):
+                    preprocessor = CountingPreprocessor(lexer)
+                    preprocessor.add_path(outputdir)
+                    preprocessor.add_path(directory)
+                    start = time.perf_counter()
+                    output = preprocessor.run(unit, "unit.c")
+                    elapsed = time.perf_counter() - start
+                    if best is None or elapsed < best:
+                        best = elapsed
+                if CPP is not None and "".join(output) != reference(unit,
+                                                    (outputdir, directory)):
+                    sys.exit("nstl.ply.cpp and {} differ at package {}, depth "
+                                            "{}".format(CPP, package, depth))
+                results.append((package, depth, preprocessor.counts, best,
+                                                                    output))
+    return results
+
+
+if __name__ == "__main__":
+    outputs = [ ]
+    for name, Generator, options in GENERATORS:
+        print(name)
+        for package, depth, counts, elapsed, output in bench(Generator,
+                                                                options):
+            outputs.append(((package, depth), output))
+            print("  package {} depth {}: {}, {:.3f} s".format(package, depth,
+                ", ".join("{} {}".format(value, count)
+                                    for count, value in counts.items()),
+                elapsed))
+    expected = dict(outputs)
+    if any(output != expected[case] for case, output in outputs):
+        sys.exit("the preprocessed outputs differ")
@@ -0,0 +1,92 @@
+"""Helpers shared by the benchmarks of code generation.
+
+Importing this module makes the nstl package of the repository importable.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                os.pardir))
+from nstl import ast
+from nstl.passes import (nameresolve, pathresolve, passmanager, codegen,
+                         nestgraph)
+
+
+# The support expected by the generated code, for the given limits.
+CONCAT = """
+#define CONCAT(...) CONCAT_N(__VA_ARGS__, CONCAT5, CONCAT4, ~)(__VA_ARGS__)
+#define CONCAT_N(a, b, c, d, e, f, ...) f
+#define CONCAT4(a, b, c, d) CONCAT4_(a, b, c, d)
+#define CONCAT4_(a, b, c, d) a ## b ## c ## d
+#define CONCAT5(a, b, c, d, e) CONCAT5_(a, b, c, d, e)
+#define CONCAT5_(a, b, c, d, e) a ## b ## c ## d ## e
+"""
+
+
+def make_template(name, params, text, nested=None, args=()):
+    """Return a template with the given parameters, as (name, parameters,
+    default) triples, whose body is the given text. If nested is given, the
+    template imports the template of that name before the text, and nests
+    it after the text with the given arguments, as (name, value) pairs.
+    """
+    params = [ast.ParameterDeclaration(ast.ParameterIdentifier(param, names),
+                    None if default is None else ast.RawExpression(default))
+                                        for param, names, default in params]
+    stmnts = [ast.RawExpression(text)]
+    if nested is not None:
+        stmnts.insert(0, ast.ImportStatement([ast.Identifier(nested)], [ ]))
+        stmnts.append(ast.NestStatement(ast.Identifier(nested),
+            [ast.ArgumentExpression(ast.ParameterIdentifier(arg, None),
+                                    ast.RawExpression(value))
+                                                    for arg, value in args]))
+    return ast.Template(ast.Identifier(name), params,
+                                            ast.CompoundStatement(stmnts))
+
+
+def resolve(program, outputdir):
+    """Run the passes of the compiler preceding code generation over a
+    program to be generated in outputdir. Return the program, its
+    Resolution, the PathTable of its paths and the path of outputdir.
+    """
+    paths = pathresolve.PathTable()
+    base = paths.path(outputdir)
+    passes = passmanager.PassManager(nameresolve.NameCollector(),
+                                     nameresolve.NameResolver(),
+                                     pathresolve.PathBuilder(paths, base))
+    context = passmanager.Context()
+    program = passes.run(program, context)
+    return program, context.resolution, paths, base
+
+
+def generate(program, Generator, options, outputdir):
+    """Generate a program in outputdir with a Generator class, for as many
+    depths as its nests need, like with --max-depth auto. The options are
+    given to the Generator, except for prune, which prunes the depths like
+    --prune-depths. Return the generator, the program and its Resolution.
+    """
+    program, resolution, paths, base = resolve(program, outputdir)
+    max_depth = nestgraph.max_nest_depth(program, resolution) + 1
+    env = codegen.Environment(codegen.NstlDefaultEnv, max_depth=max_depth)
+    options = dict(options)
+    if options.pop('prune', False):
+        options['depths'] = nestgraph.instantiation_depths(program,
+                                                    resolution, max_depth)
+    generator = Generator(False, env, paths=paths, base=base, **options)
+    generator.visit(program, resolution)
+    generator.close()
+    return generator, program, resolution
+
+
+def write_support(directory, env):
+    """Write the headers changing the depth in directory."""
+    depth = os.path.join(directory, "params", "depth")
+    os.makedirs(depth)
+    for filename, step in (("incr.h", 1), ("decr.h", -1)):
+        with open(os.path.join(depth, filename), 'w') as file:
+            for d in range(env['max_depth'] + 1):
+                file.write("#{}if NSTL_DEPTH == {}\n".format("el" if d else "",
+                                                                        d))
+                file.write("#undef NSTL_DEPTH\n")
+                file.write("#define NSTL_DEPTH {}\n".format(d + step))
+            file.write("#endif\n")
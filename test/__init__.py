@@ -3,7 +3,7 @@
 This package contains all the unit tests of the nstl compiler.
 """
 
-__all__ = ['ast', 'sema', 'codegen']
+__all__ = ['ast', 'sema', 'codegen', 'passes', 'ply']
 
 
 if __name__ == "__main__":
@@ -3,7 +3,7 @@
 This package contains all the tests of the nstl.codegen subpackage.
 """
 
-__all__ = [ ]
+__all__ = ['test_writer']
 
 
 if __name__ == "__main__":
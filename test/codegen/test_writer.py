@@ -0,0 +1,94 @@
+"""Test module for codegen/writer.py."""
+
+import os
+import unittest
+import tempfile
+from nstl.codegen.writer import Writer
+
+
+class WriterTest(unittest.TestCase):
+    """Test class for the Writer and the OutputFiles it creates."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def contents(self, name):
+        with open(self.path(name)) as file:
+            return file.read()
+
+    def test_should_write_a_file_with_a_single_call_when_closed(self):
+        writer = Writer()
+        file = writer.open(self.path("a.h"))
+        file.write("first\n")
+        file.write("second\n")
+        self.assertFalse(os.path.exists(self.path("a.h")))
+        file.close()
+        self.assertEqual("first\nsecond\n", self.contents("a.h"))
+        self.assertEqual(1, writer.statistics()['file writes'])
+
+    def test_should_flush_the_file_written_to_least_recently(self):
+        writer = Writer(max_pending=2)
+        a, b = writer.open(self.path("a.h")), writer.open(self.path("b.h"))
+        a.write("a\n")
+        b.write("b\n")
+        c = writer.open(self.path("c.h"))
+        self.assertEqual("a\n", self.contents("a.h"))
+        self.assertFalse(os.path.exists(self.path("b.h")))
+        self.assertEqual(2, writer.statistics()['peak buffered files'])
+        c.close()
+
+    def test_should_append_to_a_flushed_file(self):
+        writer = Writer(max_pending=1)
+        a = writer.open(self.path("a.h"))
+        a.write("a\n")
+        writer.open(self.path("b.h")).write("b\n")
+        a.write("again\n")
+        writer.close_all()
+        self.assertEqual("a\nagain\n", self.contents("a.h"))
+        self.assertEqual("b\n", self.contents("b.h"))
+
+    def test_should_create_an_empty_file_written_to_nothing(self):
+        writer = Writer()
+        writer.open(self.path("empty.h")).close()
+        self.assertEqual("", self.contents("empty.h"))
+
+    def test_should_close_a_file_once(self):
+        writer = Writer()
+        file = writer.open(self.path("a.h"))
+        file.write("a\n")
+        file.close()
+        file.close()
+        writer.close_all()
+        self.assertEqual(1, writer.statistics()['file writes'])
+
+    def test_should_not_overwrite_an_existing_file_unless_asked_to(self):
+        with open(self.path("a.h"), 'w') as file:
+            file.write("kept\n")
+        with self.assertRaises(IOError):
+            Writer().open(self.path("a.h"))
+        file = Writer(overwrite=True).open(self.path("a.h"))
+        file.write("replaced\n")
+        file.close()
+        self.assertEqual("replaced\n", self.contents("a.h"))
+
+    def test_should_only_count_in_a_dry_run(self):
+        writer = Writer(dry_run=True)
+        file = writer.open(self.path("a.h"))
+        file.write("12345")
+        file.close()
+        self.assertFalse(os.path.exists(self.path("a.h")))
+        statistics = writer.statistics()
+        self.assertEqual(1, statistics['files written'])
+        self.assertEqual(5, statistics['bytes written'])
+
+    def test_should_reject_buffering_no_file(self):
+        with self.assertRaises(ValueError):
+            Writer(max_pending=0)
+
+
+if __name__ == "__main__":
+    pass
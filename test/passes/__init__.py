@@ -0,0 +1,11 @@
+"""
+This package contains all the tests of the nstl.passes subpackage.
+"""
+
+__all__ = ['test_astdiff', 'test_codegen', 'test_nameresolve',
+           'test_nestgraph', 'test_passmanager', 'test_pathresolve',
+           'test_prune']
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,85 @@
+"""Test module for passes/astdiff.py."""
+
+import unittest
+from nstl import parse
+from nstl.passes import astdiff
+
+
+SOURCE = """
+namespace ns {
+    template t (T)
+    {
+        {% T_ x; %}
+    }
+    template u (T)
+    {
+        import t
+    }
+}
+"""
+
+
+CYCLE = """
+namespace ns {
+    template a (T) { import b  {% a %} }
+    template b (T) { import a  {% b %} }
+    template c (T) { {% c %} }
+}
+"""
+
+
+class FingerprintTest(unittest.TestCase):
+    """Test class for the fingerprints of the templates of a program."""
+
+    def setUp(self):
+        self.parser = parse.NstlParser()
+        self.program = self.parser.parse(SOURCE)
+
+    def test_should_fingerprint_a_lazy_and_an_eager_parse_alike(self):
+        eager = parse.NstlParser(lazybodies=False).parse(SOURCE)
+        self.assertEqual(astdiff.fingerprints(eager),
+                         astdiff.fingerprints(self.program))
+        self.assertFalse(astdiff.diff(eager, self.parser.parse(SOURCE)))
+
+    def test_should_not_change_once_the_bodies_are_parsed(self):
+        before = astdiff.fingerprints(self.parser.parse(SOURCE))
+        for template in self.program.decls[0].decls:
+            template.body
+        self.assertEqual(before, astdiff.fingerprints(self.program))
+
+    def test_should_report_the_template_whose_body_changed(self):
+        # The template importing the changed one changes along with it.
+        changed = self.parser.parse(SOURCE.replace("T_ x;", "T_ y;"))
+        diff = astdiff.diff(self.program, changed)
+        self.assertEqual([('namespace', 'ns'), ('template', 'ns.t'),
+                          ('template', 'ns.u')], diff.changed)
+        self.assertEqual(([ ], [ ]), (diff.added, diff.removed))
+
+    def test_should_report_the_templates_depending_on_changed_parameters(self):
+        source = SOURCE + """
+        namespace other {
+            template v (T) { nest ns.t with T = {% int %} }
+            template w (T) { }
+        }
+        """
+        changed = self.parser.parse(source.replace("t (T)", "t (T, U)"))
+        diff = astdiff.diff(self.parser.parse(source), changed)
+        self.assertEqual([('namespace', 'ns'), ('template', 'ns.t'),
+                          ('template', 'ns.u'), ('namespace', 'other'),
+                          ('template', 'other.v')], diff.changed)
+
+    def test_should_report_the_templates_depending_on_each_other(self):
+        changed = self.parser.parse(CYCLE.replace("{% a %}", "{% A %}"))
+        diff = astdiff.diff(self.parser.parse(CYCLE), changed)
+        self.assertEqual([('namespace', 'ns'), ('template', 'ns.a'),
+                          ('template', 'ns.b')], diff.changed)
+        self.assertFalse(astdiff.diff(self.parser.parse(CYCLE),
+                                      self.parser.parse(CYCLE)))
+
+    def test_should_report_nothing_for_the_same_program(self):
+        self.assertFalse(astdiff.diff(self.program,
+                                                self.parser.parse(SOURCE)))
+
+
+if __name__ == "__main__":
+    pass
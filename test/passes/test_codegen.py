@@ -0,0 +1,241 @@
+"""Test module for passes/codegen.py."""
+
+import io
+import os
+import unittest
+import tempfile
+from string import Template
+from nstl import parse
+from nstl.ply import lex, cpp
+from nstl.passes import nameresolve, pathresolve, passmanager, codegen
+
+
+TEXTS = [
+    "",
+    "no placeholders at all",
+    "$name",
+    "${name}suffix",
+    "#include \"${directory}/$file\"\n#define $name ${value}",
+    "$$name costs $$5, $name ${value}$$",
+    "$name$value$name",
+]
+
+ENV = codegen.Environment(name="NAME", value=42, directory="dir",
+                          file="file.h")
+
+
+class CompiledTemplateTest(unittest.TestCase):
+    """Test class for the emit templates compiled once."""
+
+    def test_should_render_like_a_string_Template(self):
+        for text in TEXTS:
+            self.assertEqual(Template(text).substitute(ENV),
+                             codegen.CompiledTemplate(text).render(ENV, { }))
+
+    def test_should_prefer_the_overrides_to_the_environment(self):
+        for text in TEXTS:
+            self.assertEqual(Template(text).substitute(ENV, name="other"),
+                codegen.CompiledTemplate(text).render(ENV, {'name': "other"}))
+
+    def test_should_split_the_text_at_its_placeholders(self):
+        compiled = codegen.CompiledTemplate("a $x b ${y}$$c")
+        self.assertEqual(('a ', ' b ', '$c'), compiled.literals)
+        self.assertEqual(('x', 'y'), compiled.names)
+
+    def test_should_raise_KeyError_for_a_missing_name(self):
+        with self.assertRaises(KeyError):
+            codegen.CompiledTemplate("$missing").render(ENV, { })
+
+    def test_should_reject_an_invalid_placeholder_like_a_string_Template(self):
+        text = "first line\nsecond $ line"
+        with self.assertRaises(ValueError) as expected:
+            Template(text).substitute(ENV)
+        with self.assertRaises(ValueError) as compiled:
+            codegen.CompiledTemplate(text)
+        self.assertEqual(str(expected.exception), str(compiled.exception))
+
+    def test_should_compile_each_text_once(self):
+        text = "$name and ${value}, compiled once"
+        self.assertIs(codegen.compile_template(text),
+                      codegen.compile_template(text))
+
+    def test_should_substitute_through_the_emitter(self):
+        emitter = codegen.TemplatedEmitter(codegen.Environment(ENV))
+        self.assertEqual("NAME = 7", emitter.subs("$name = $value", value=7))
+
+
+class _CountingPreprocessor(cpp.Preprocessor):
+    """A Preprocessor counting the #if and #elif expressions it evaluates."""
+    evaluations = 0
+
+    def evalexpr(self, tokens):
+        self.evaluations += 1
+        return super().evalexpr(tokens)
+
+
+def dispatch(values, tree):
+    """Return the output of the Generator dispatching on the macro M for
+    each of the given values.
+    """
+    output = io.StringIO()
+    generator = codegen.Generator(env=codegen.Environment(
+                    codegen.NstlDefaultEnv), ostream=output, tree=tree)
+    generator._dispatch("M", 'value', values,
+                        lambda: generator.emit("case_${value}"))
+    return output.getvalue()
+
+
+def preprocess(text, value):
+    """Return the output of text with M defined to value, and the number of
+    expressions evaluated.
+    """
+    preprocessor = _CountingPreprocessor(lex.lex(module=cpp))
+    preprocessor.parse("#define M {}\n{}".format(value, text), "test.c")
+    output = [ ]
+    while True:
+        tok = preprocessor.token()
+        if not tok:
+            break
+        output.append(str(tok.value))
+    return "".join(output).strip(), preprocessor.evaluations
+
+
+class DispatchTest(unittest.TestCase):
+    """Test class for the dispatch on a macro expanding to a natural number,
+    as chains of equality tests or as trees of range tests.
+    """
+
+    def assertDispatches(self, values, tree):
+        text = dispatch(values, tree)
+        for value in range(max(values) + 3):
+            expected = "case_{}".format(value) if value in values else ""
+            self.assertEqual(expected, preprocess(text, value)[0])
+
+    def test_should_select_the_case_of_the_value_of_the_macro(self):
+        for tree in (False, True):
+            self.assertDispatches(list(range(5)), tree)
+
+    def test_should_select_nothing_between_values_with_a_tree(self):
+        for values in ([0, 2, 3], [1], [0, 1, 4, 7, 8], [3, 4]):
+            self.assertDispatches(values, True)
+
+    def test_should_evaluate_a_logarithmic_number_of_tests_with_a_tree(self):
+        text = dispatch(list(range(32)), True)
+        for value in (0, 13, 31, 32):
+            self.assertLessEqual(preprocess(text, value)[1], 1 + 5)
+
+    def test_should_emit_nothing_for_no_values(self):
+        self.assertEqual("", dispatch([ ], True))
+        self.assertEqual("", dispatch([ ], False))
+
+
+PROGRAM = """
+namespace lib {
+    template leaf (T = {% int %}, F(x) = {% (x) %}) {
+        {% static inline T_ F_(leaf) (T_ x); %}
+    }
+    template middle (T = {% int %}, F(x) = {% (x) %}) {
+        import leaf
+        nest leaf with T = {% long %}
+        {% static inline T_ F_(middle) (T_ x); %}
+    }
+    template top (T = {% int %}, F(x) = {% (x) %}) {
+        import middle
+        nest middle with T = {% short %}
+    }
+}
+"""
+
+CONCAT = """
+#define CONCAT(...) CONCAT_N(__VA_ARGS__, CONCAT5, CONCAT4, ~)(__VA_ARGS__)
+#define CONCAT_N(a, b, c, d, e, f, ...) f
+#define CONCAT4(a, b, c, d) CONCAT4_(a, b, c, d)
+#define CONCAT4_(a, b, c, d) a ## b ## c ## d
+#define CONCAT5(a, b, c, d, e) CONCAT5_(a, b, c, d, e)
+#define CONCAT5_(a, b, c, d, e) a ## b ## c ## d ## e
+"""
+
+
+def generate(Generator, directory, env):
+    """Generate PROGRAM in directory with the given Generator."""
+    paths = pathresolve.PathTable()
+    base = paths.path(directory)
+    passes = passmanager.PassManager(nameresolve.NameCollector(),
+                                     nameresolve.NameResolver(),
+                                     pathresolve.PathBuilder(paths, base))
+    context = passmanager.Context()
+    program = passes.run(parse.NstlParser().parse(PROGRAM), context)
+    generator = Generator(False, env, paths=paths, base=base)
+    generator.visit(program, context.resolution)
+    generator.close()
+
+
+def write_support(directory, env):
+    """Write the headers changing the depth in directory."""
+    depth = os.path.join(directory, "params", "depth")
+    os.makedirs(depth)
+    for filename, step in (("incr.h", 1), ("decr.h", -1)):
+        with open(os.path.join(depth, filename), 'w') as file:
+            for d in range(env['max_depth'] + 1):
+                file.write("#{}if NSTL_DEPTH == {}\n".format("el" if d else "",
+                                                                        d))
+                file.write("#undef NSTL_DEPTH\n")
+                file.write("#define NSTL_DEPTH {}\n".format(d + step))
+            file.write("#endif\n")
+
+
+def instantiate(directory, package, depth, name):
+    """Return the tokens output by instantiating the template lib.name in a
+    package, at a depth, with the output generated in directory.
+    """
+    unit = (CONCAT + "#define NSTL_PACKAGE {}\n#define NSTL_DEPTH {}\n"
+                     "#define T int\n#define F(x) x\n"
+                     "#include \"lib/{}.h\"\n").format(package, depth, name)
+    preprocessor = cpp.Preprocessor(lex.lex(module=cpp))
+    preprocessor.add_path(os.path.join(directory, "out"))
+    preprocessor.add_path(directory)
+    preprocessor.parse(unit, "unit.c")
+    output = [ ]
+    while True:
+        tok = preprocessor.token()
+        if not tok:
+            break
+        if tok.type not in preprocessor.t_WS:
+            output.append(str(tok.value))
+    return output
+
+
+class DispatchGeneratorTest(unittest.TestCase):
+    """Test class for the output of the DispatchGenerator, which must
+    preprocess like the output of the Generator.
+    """
+
+    def setUp(self):
+        self.env = codegen.Environment(codegen.NstlDefaultEnv, max_depth=3,
+                                                            max_package=2)
+        self.directories = { }
+        for Generator in (codegen.Generator, codegen.DispatchGenerator):
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            generate(Generator, os.path.join(directory.name, "out"), self.env)
+            write_support(directory.name, self.env)
+            self.directories[Generator] = directory.name
+
+    def test_should_preprocess_like_the_output_of_the_Generator(self):
+        # Each template can be instantiated at the depths its nests leave.
+        instantiable = [["leaf", "middle", "top"], ["leaf", "middle"],
+                        ["leaf"]]
+        for package in range(self.env['max_package']):
+            for depth, names in enumerate(instantiable):
+                for name in names:
+                    expected = instantiate(
+                            self.directories[codegen.Generator],
+                            package, depth, name)
+                    self.assertTrue(expected)
+                    self.assertEqual(expected, instantiate(
+                            self.directories[codegen.DispatchGenerator],
+                            package, depth, name))
+
+
+if __name__ == "__main__":
+    pass
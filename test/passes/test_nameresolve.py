@@ -0,0 +1,152 @@
+"""Test module for passes/nameresolve.py."""
+
+import os
+import glob
+import unittest
+import threading
+from nstl import ast, parse
+from nstl.passes import nameresolve, passmanager
+from nstl.passes.nameresolve import Scope
+
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        os.pardir, os.pardir, "examples", "inputs")
+
+UNRESOLVED = """
+namespace ns {
+    template a (T) { import b }
+    template b (T) { import missing }
+    template c (T) { import other }
+}
+"""
+
+
+class ScopeTest(unittest.TestCase):
+    """Test class for the index of the names reachable from a Scope."""
+
+    def setUp(self):
+        self.root = Scope()
+        self.child = Scope(self.root, "child")
+        self.grandchild = Scope(self.child, "grandchild")
+
+    def test_should_find_a_name_bound_in_a_parent_scope(self):
+        self.root["x"] = 1
+        self.assertEqual(1, self.grandchild["x"])
+        self.assertIn("x", self.child)
+
+    def test_should_raise_NameError_for_a_name_bound_nowhere(self):
+        with self.assertRaises(NameError):
+            self.grandchild["x"]
+        self.assertNotIn("x", self.grandchild)
+
+    def test_should_shadow_the_name_of_a_parent_scope(self):
+        self.root["x"] = 1
+        self.child["x"] = 2
+        self.assertEqual(2, self.grandchild["x"])
+        self.assertEqual(1, self.root["x"])
+
+    def test_should_share_the_index_of_the_parent_when_binding_nothing(self):
+        self.root["x"] = 1
+        self.assertIs(self.root.bindings(), self.grandchild.bindings())
+
+    def test_should_see_a_name_bound_after_the_index_was_built(self):
+        self.root["x"] = 1
+        self.grandchild.bindings()
+        self.root["y"] = 2
+        self.assertEqual(2, self.grandchild["y"])
+        self.assertEqual(2, self.child["y"])
+
+    def test_should_keep_shadowing_a_name_bound_again_in_a_parent(self):
+        self.child["x"] = 2
+        self.grandchild.bindings()
+        self.root["x"] = 1
+        self.assertEqual(2, self.grandchild["x"])
+        self.assertEqual(1, self.root["x"])
+
+    def test_should_not_leak_a_name_bound_in_a_scope_sharing_its_index(self):
+        self.root["x"] = 1
+        self.child.bindings()
+        self.child["y"] = 2
+        self.assertNotIn("y", self.root)
+        self.assertEqual(2, self.grandchild["y"])
+
+    def test_should_see_a_name_bound_in_a_scope_created_after_indexing(self):
+        self.root.bindings()
+        sibling = Scope(self.root, "sibling")
+        self.root["x"] = 1
+        self.assertEqual(1, sibling["x"])
+
+    def test_should_forget_a_name_once_unbound(self):
+        self.root["x"] = 1
+        self.child["x"] = 2
+        self.grandchild.bindings()
+        del self.child["x"]
+        self.assertEqual(1, self.grandchild["x"])
+        del self.root["x"]
+        self.assertNotIn("x", self.grandchild)
+
+    def test_should_match_a_walk_of_the_parent_chain(self):
+        scopes = [self.root, self.child, self.grandchild]
+        for i in range(12):
+            scopes[i % 3]["n{}".format(i % 5)] = i
+            for scope in scopes:
+                expected = { }
+                for outer in reversed([scope] + list(scope.parents())):
+                    expected.update(dict(outer.items()))
+                self.assertEqual(expected, scope.bindings())
+
+
+def resolve(sources, jobs, lazybodies):
+    """Resolve the program made of the given sources with a number of jobs.
+    Return, for each node of the program resolved to a declaration, its
+    position in the program and the fully qualified name of the declaration.
+    """
+    parser = parse.NstlParser(lazybodies=lazybodies)
+    program = nameresolve.merge_asts(*[parser.parse(source)
+                                                    for source in sources])
+    context = passmanager.Context()
+    program = nameresolve.NameResolver(jobs).visit(program, context)
+    resolution = context.resolution
+    # The nodes of a lazy body are only recorded once the body is parsed.
+    for decl in resolution.index.values():
+        if isinstance(decl, ast.Template):
+            decl.body
+    qualnames = nameresolve.canonical_names(resolution.index)
+    return [(ordinal, qualnames[id(resolution.resolved[node])])
+            for ordinal, node in enumerate(nameresolve._preorder(program))
+                                            if node in resolution.resolved]
+
+
+class ParallelNameResolverTest(unittest.TestCase):
+    """Test class for the resolution of the templates by worker processes,
+    which must resolve a program like a single process.
+    """
+
+    def setUp(self):
+        # The workers are only forked when no other thread is running,
+        # otherwise the templates are resolved by the current process.
+        if threading.active_count() != 1:
+            self.skipTest("the workers can't be forked with other threads")
+        self.sources = [ ]
+        for filename in sorted(glob.glob(os.path.join(EXAMPLES, "*.nstl"))):
+            with open(filename) as file:
+                self.sources.append(file.read())
+
+    def test_should_resolve_the_examples_like_a_single_process(self):
+        for lazybodies in (True, False):
+            expected = resolve(self.sources, 1, lazybodies)
+            self.assertTrue(expected)
+            self.assertEqual(expected, resolve(self.sources, 4, lazybodies))
+
+    def test_should_report_the_first_unresolved_name_like_a_single_process(self):
+        for lazybodies in (True, False):
+            errors = [ ]
+            for jobs in (1, 4):
+                with self.assertRaises(NameError) as error:
+                    resolve([UNRESOLVED], jobs, lazybodies)
+                errors.append(str(error.exception))
+            self.assertEqual(["unresolved reference missing"] * 2, errors)
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,105 @@
+"""Test module for passes/nestgraph.py."""
+
+import unittest
+from nstl import interface, parse
+from nstl.passes import nameresolve, nestgraph, passmanager
+
+
+LIBRARY = """
+namespace lib {
+    template leaf (T) { {% leaf %} }
+    template middle (T) { nest leaf }
+    template top (T) { import middle  nest middle }
+}
+"""
+
+CLIENT = """
+namespace client {
+    template user (T) { nest lib.top }
+    template twice (T) { nest user }
+}
+"""
+
+
+def resolve(*sources, programs=()):
+    """Return the program made of the given sources and programs, and its
+    Resolution.
+    """
+    parser = parse.NstlParser()
+    program = nameresolve.merge_asts(*(list(programs) +
+                                [parser.parse(source) for source in sources]))
+    context = passmanager.Context()
+    program = nameresolve.NameResolver().visit(program, context)
+    return program, context.resolution
+
+
+def by_name(depths):
+    return {template.name.value: found for template, found in depths.items()}
+
+
+class NestGraphTest(unittest.TestCase):
+    """Test class for the depths the templates of a program need."""
+
+    def test_should_find_the_longest_chain_of_nests(self):
+        program, resolution = resolve(LIBRARY)
+        self.assertEqual(2, nestgraph.max_nest_depth(program, resolution))
+
+    def test_should_not_count_the_templates_imported_on_the_way(self):
+        program, resolution = resolve("""
+        namespace ns {
+            template a (T) { import b }
+            template b (T) { nest c }
+            template c (T) { }
+        }""")
+        self.assertEqual(1, nestgraph.max_nest_depth(program, resolution))
+
+    def test_should_find_no_depth_for_a_template_nesting_itself(self):
+        program, resolution = resolve("""
+        namespace ns {
+            template a (T) { import b }
+            template b (T) { nest a }
+        }""")
+        self.assertIsNone(nestgraph.max_nest_depth(program, resolution))
+
+    def test_should_find_the_depths_each_template_can_be_instantiated_at(self):
+        program, resolution = resolve(LIBRARY)
+        depths = nestgraph.instantiation_depths(program, resolution, 5)
+        self.assertEqual({'leaf': [0, 1, 2], 'middle': [0, 1], 'top': [0]},
+                         by_name(depths))
+
+    def test_should_stop_at_the_max_depth(self):
+        program, resolution = resolve(LIBRARY)
+        depths = nestgraph.instantiation_depths(program, resolution, 2)
+        self.assertEqual([0, 1], by_name(depths)['leaf'])
+
+    def test_should_find_every_depth_for_a_template_nesting_itself(self):
+        program, resolution = resolve("""
+        namespace ns {
+            template a (T) { nest a }
+        }""")
+        depths = nestgraph.instantiation_depths(program, resolution, 4)
+        self.assertEqual({'a': [0, 1, 2, 3]}, by_name(depths))
+
+    def test_should_not_follow_the_nests_of_an_interface(self):
+        library, resolution = resolve(LIBRARY)
+        program, resolution = resolve(CLIENT,
+                    programs=[interface.make_interface(resolution)])
+        self.assertEqual(1, nestgraph.max_nest_depth(program, resolution))
+        depths = nestgraph.instantiation_depths(program, resolution, 5)
+        self.assertEqual({'user': [0, 1], 'twice': [0]}, by_name(depths))
+
+    def test_should_need_more_depths_than_found_through_an_interface(self):
+        # The templates of an interface are nested deeper by their clients
+        # than the library alone tells, which is why a library can't be
+        # generated for fewer depths than the default when its interface
+        # is emitted.
+        library, resolution = resolve(LIBRARY)
+        alone = nestgraph.max_nest_depth(library, resolution)
+        program, resolution = resolve(LIBRARY, CLIENT)
+        self.assertGreater(nestgraph.max_nest_depth(program, resolution), alone)
+        depths = nestgraph.instantiation_depths(program, resolution, 5)
+        self.assertEqual([0, 1, 2, 3, 4], by_name(depths)['leaf'])
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,131 @@
+"""Test module for passes/passmanager.py."""
+
+import unittest
+from nstl import ast
+from nstl.passes import passmanager
+
+
+def make_program():
+    body = ast.CompoundStatement([ast.RawExpression("x")])
+    return ast.Program([ast.Namespace(ast.Identifier("ns"),
+                            [ast.Template(ast.Identifier("t"), [ ], body)])])
+
+
+class _Recorder(ast.IterativeVisitor):
+    """Record the classes of the nodes it walks, in a log shared with other
+    passes, along with its name.
+    """
+    def __init__(self, name, log, requires=()):
+        self.name = name
+        self.log = log
+        self.requires = requires
+
+    def pre_visit_Program(self, root, context):
+        return ( )
+
+    def generic_pre_visit(self, node, *args):
+        self.log.append((self.name, type(node).__name__))
+
+
+class _First(_Recorder):
+    pass
+
+
+class _Second(_Recorder):
+    pass
+
+
+class _SkipTemplates(_Recorder):
+    def pre_visit_Template(self, node, *args):
+        self.log.append((self.name, 'Template'))
+        return ast.SKIP
+
+
+class _Rename(ast.IterativeTransformer):
+    """Uppercase the identifiers, and mark the context it ran with."""
+    def pre_visit_Program(self, root, context):
+        context.renamed = True
+        return ( )
+
+    def post_visit_Identifier(self, node):
+        return ast.Identifier(node.value.upper())
+
+
+class _Whole(ast.NodeVisitor):
+    """A pass taking over the whole walk, which can't be fused. It records
+    whether the context it runs with was marked by _Rename.
+    """
+    def __init__(self, log, requires=()):
+        self.log = log
+        self.requires = requires
+
+    def visit_Program(self, root, context):
+        self.log.append(('whole', getattr(context, 'renamed', False)))
+
+
+class PassManagerTest(unittest.TestCase):
+    """Test class for the scheduling and fusion of passes."""
+
+    def setUp(self):
+        self.log = [ ]
+
+    def test_should_fuse_the_passes_that_are_ready_together(self):
+        first, second = _First('1', self.log), _Second('2', self.log)
+        manager = passmanager.PassManager(first, second)
+        self.assertEqual([[first, second]], manager.schedule())
+
+    def test_should_interleave_the_hooks_of_fused_passes(self):
+        manager = passmanager.PassManager(_First('1', self.log),
+                                          _Second('2', self.log))
+        manager.run(make_program())
+        self.assertEqual([('1', 'Namespace'), ('2', 'Namespace'),
+                          ('1', 'Identifier'), ('2', 'Identifier')],
+                         self.log[:4])
+
+    def test_should_run_a_pass_after_the_passes_it_requires(self):
+        second = _Second('2', self.log, requires=(_First,))
+        first = _First('1', self.log)
+        manager = passmanager.PassManager(second, first)
+        self.assertEqual([[first], [second]], manager.schedule())
+
+    def test_should_ignore_requirements_on_absent_passes(self):
+        second = _Second('2', self.log, requires=(_First,))
+        self.assertEqual([[second]],
+                         passmanager.PassManager(second).schedule())
+
+    def test_should_not_fuse_a_pass_with_visit_methods(self):
+        whole, first = _Whole(self.log), _First('1', self.log)
+        manager = passmanager.PassManager(whole, first)
+        self.assertEqual([[whole], [first]], manager.schedule())
+
+    def test_should_reject_cyclic_dependencies(self):
+        first = _First('1', self.log, requires=(_Second,))
+        second = _Second('2', self.log, requires=(_First,))
+        with self.assertRaises(ValueError):
+            passmanager.PassManager(first, second).schedule()
+
+    def test_should_keep_walking_for_a_pass_that_did_not_skip(self):
+        manager = passmanager.PassManager(_SkipTemplates('s', self.log),
+                                          _First('1', self.log))
+        manager.run(make_program())
+        self.assertIn(('1', 'RawExpression'), self.log)
+        self.assertNotIn(('s', 'RawExpression'), self.log)
+        self.assertIn(('s', 'Template'), self.log)
+
+    def test_should_replace_the_nodes_returned_by_a_fused_transformer(self):
+        manager = passmanager.PassManager(_Rename(), _First('1', self.log))
+        program = manager.run(make_program())
+        self.assertEqual("NS", program.decls[0].name.value)
+        self.assertEqual("T", program.decls[0].decls[0].name.value)
+
+    def test_should_give_the_same_context_to_every_pass(self):
+        context = passmanager.Context()
+        manager = passmanager.PassManager(_Whole(self.log, (_Rename,)),
+                                          _Rename())
+        manager.run(make_program(), context)
+        self.assertTrue(context.renamed)
+        self.assertEqual([('whole', True)], self.log)
+
+
+if __name__ == "__main__":
+    pass
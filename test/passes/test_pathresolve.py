@@ -0,0 +1,65 @@
+"""Test module for passes/pathresolve.py."""
+
+import os
+import unittest
+from nstl import parse
+from nstl.passes import nameresolve, passmanager, pathresolve
+
+
+PROGRAM = """
+namespace lib {
+    template leaf (T) { }
+    namespace detail {
+        template helper (T) { }
+    }
+}
+"""
+
+
+def build_paths(base=None):
+    """Return PROGRAM with its paths built inside of the base directory, if
+    any, and the PathTable of its paths.
+    """
+    table = pathresolve.PathTable()
+    if base is not None:
+        base = table.path(base)
+    passes = passmanager.PassManager(nameresolve.NameCollector(),
+                                     pathresolve.PathBuilder(table, base))
+    program = passes.run(parse.NstlParser().parse(PROGRAM),
+                         passmanager.Context())
+    return program, table
+
+
+def by_name(declared):
+    return {decl.name.value: str(path) for decl, path in declared.items()}
+
+
+class PathBuilderTest(unittest.TestCase):
+    """Test class for the paths of the namespaces and templates."""
+
+    def test_should_map_each_declaration_to_its_path(self):
+        program, table = build_paths()
+        self.assertEqual({'lib': "lib",
+                          'leaf': os.path.join("lib", "leaf"),
+                          'detail': os.path.join("lib", "detail"),
+                          'helper': os.path.join("lib", "detail", "helper")},
+                         by_name(table.declared))
+
+    def test_should_put_the_top_level_declarations_inside_of_the_base(self):
+        program, table = build_paths("out")
+        self.assertEqual(os.path.join("out", "lib", "leaf"),
+                         by_name(table.declared)['leaf'])
+
+    def test_should_intern_the_paths_in_the_table(self):
+        program, table = build_paths()
+        lib, = program.decls
+        self.assertIs(table.path("lib"), table.declared[lib])
+
+    def test_should_leave_the_tree_alone(self):
+        program, table = build_paths()
+        for decl in table.declared:
+            self.assertNotIn('path', decl.a)
+
+
+if __name__ == "__main__":
+    pass
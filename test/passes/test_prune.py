@@ -0,0 +1,112 @@
+"""Test module for passes/prune.py."""
+
+import os
+import unittest
+import tempfile
+from nstl import ast, compile, parse
+from nstl.passes import nameresolve, passmanager, prune
+
+
+PROGRAM = """
+namespace lib {
+    template leaf (T) { {% leaf %} }
+    template nested (T) { nest leaf }
+    template imported (T) { }
+    template unused (T) { import leaf }
+    namespace detail {
+        template helper (T) { }
+    }
+}
+namespace app {
+    template main (T) { import lib.imported  nest lib.nested }
+}
+"""
+
+
+def prune_program(*roots):
+    """Return PROGRAM pruned to the templates reachable from roots."""
+    passes = passmanager.PassManager(nameresolve.NameCollector(),
+                                     nameresolve.NameResolver(),
+                                     prune.Pruner(roots))
+    return passes.run(parse.NstlParser().parse(PROGRAM))
+
+
+def declared(node, qualname=""):
+    """Return the fully qualified names of the namespaces and templates
+    declared in a program or a namespace.
+    """
+    names = [ ]
+    for decl in node.decls:
+        name = nameresolve.qualify(qualname, decl.name.value)
+        names.append(name)
+        if isinstance(decl, ast.Namespace):
+            names.extend(declared(decl, name))
+    return names
+
+
+class PrunerTest(unittest.TestCase):
+    """Test class for the removal of the templates not reachable from the
+    roots of a program.
+    """
+
+    def test_should_remove_the_unreachable_templates(self):
+        names = declared(prune_program("app.main"))
+        self.assertNotIn("lib.unused", names)
+        self.assertNotIn("lib.detail.helper", names)
+
+    def test_should_keep_the_templates_only_reached_by_a_nest(self):
+        self.assertEqual(["lib", "lib.leaf", "lib.nested", "lib.imported",
+                          "app", "app.main"],
+                         declared(prune_program("app.main")))
+
+    def test_should_drop_the_namespaces_emptied(self):
+        names = declared(prune_program("lib.leaf"))
+        self.assertEqual(["lib", "lib.leaf"], names)
+
+    def test_should_keep_every_template_of_a_root_namespace(self):
+        names = declared(prune_program("lib.detail"))
+        self.assertEqual(["lib", "lib.detail", "lib.detail.helper"], names)
+
+    def test_should_raise_NameError_for_an_unknown_root(self):
+        with self.assertRaises(NameError):
+            prune_program("lib.missing")
+
+
+class CompilerRootTest(unittest.TestCase):
+    """Test class for the templates generated by the compiler with and
+    without roots.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.input = os.path.join(self.directory, "input.nstl")
+        with open(self.input, 'w') as file:
+            file.write(PROGRAM)
+
+    def generated(self, *options):
+        """Return the names of the templates generated with the given
+        options, as their paths in the output directory.
+        """
+        output = os.path.join(self.directory, "out")
+        compile.Compiler().compile(list(options) +
+                                   ["-f", "-o", output, self.input])
+        return sorted(os.path.relpath(os.path.join(path, filename), output)
+                      for path, directories, filenames in os.walk(output)
+                      for filename in filenames if filename.endswith(".h"))
+
+    def test_should_generate_every_template_without_a_root(self):
+        self.assertEqual([os.path.join(*name.split(".")) + ".h" for name in
+                            sorted(["app.main", "lib.detail.helper",
+                                    "lib.imported", "lib.leaf", "lib.nested",
+                                    "lib.unused"])],
+                         self.generated())
+
+    def test_should_only_generate_the_reachable_templates_with_a_root(self):
+        self.assertEqual([os.path.join("lib", "leaf.h")],
+                         self.generated("--root", "lib.leaf"))
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,9 @@
+"""
+This package contains all the tests of the nstl.ply subpackage.
+"""
+
+__all__ = ['test_cpp']
+
+
+if __name__ == "__main__":
+    pass
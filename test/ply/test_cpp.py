@@ -0,0 +1,112 @@
+"""Test module for ply/cpp.py."""
+
+import shutil
+import subprocess
+import unittest
+from nstl.ply import lex, cpp
+
+
+CPP = shutil.which("cpp")
+
+
+def preprocess(source):
+    """Return the output of nstl.ply.cpp on source, without whitespace."""
+    preprocessor = cpp.Preprocessor(lex.lex(module=cpp))
+    preprocessor.parse(source, "test.c")
+    output = [ ]
+    while True:
+        tok = preprocessor.token()
+        if not tok:
+            break
+        output.append(str(tok.value))
+    return "".join("".join(output).split())
+
+
+def reference(source):
+    """Return the output of the system's cpp on source, without whitespace."""
+    output = subprocess.run([CPP, "-P", "-"], input=source, check=True,
+                        stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return "".join(output.split())
+
+
+@unittest.skipIf(CPP is None, "cpp is not installed")
+class PreprocessorTest(unittest.TestCase):
+    """Test class comparing the Preprocessor with the system's cpp."""
+
+    def assertSameOutput(self, source):
+        self.assertEqual(reference(source), preprocess(source))
+
+    def test_should_paste_tokens_into_a_single_token(self):
+        self.assertSameOutput("#define CAT(a, b) a ## b\n"
+                              "CAT(foo, bar) CAT(1, 2)\n")
+
+    def test_should_paste_empty_arguments_as_placemarkers(self):
+        self.assertSameOutput("#define CAT(a, b, c) a ## b ## c\n"
+                              "CAT(, x, ) CAT(x, , y) CAT(, , )\n")
+
+    def test_should_expand_a_pasted_macro_name(self):
+        self.assertSameOutput("#define CAT(a, b) a ## b\n"
+                              "#define foobar 42\n"
+                              "CAT(foo, bar)\n")
+
+    def test_should_rescan_a_macro_name_with_the_tokens_following_it(self):
+        self.assertSameOutput(
+            "#define CONCAT(...) CONCAT_N(__VA_ARGS__, C3, C2, ~)(__VA_ARGS__)\n"
+            "#define CONCAT_N(a, b, c, d, ...) d\n"
+            "#define C2(a, b) a ## b\n"
+            "#define C3(a, b, c) a ## b ## c\n"
+            "CONCAT(x, y) CONCAT(x, y, z)\n")
+
+    def test_should_not_expand_a_macro_recursively_in_its_arguments(self):
+        self.assertSameOutput("#define CAT(a, b) CAT_(a, b)\n"
+                              "#define CAT_(a, b) a ## b\n"
+                              "#define U CAT(U, _)\n"
+                              "U\n")
+
+    def test_should_expand_a_macro_in_its_own_arguments(self):
+        self.assertSameOutput("#define ID(x) x\n"
+                              "ID(ID(3)) ID(ID(ID(3)))\n")
+
+    def test_should_expand_the_arguments_before_substituting_them(self):
+        self.assertSameOutput("#define f(x) x+1\n"
+                              "f(f(1))\n")
+
+    def test_should_paste_an_argument_expanded_by_the_same_macro(self):
+        self.assertSameOutput("#define CAT(a, b) a ## b\n"
+                              "#define X(n) CAT(v, n)\n"
+                              "X(X(1))\n")
+
+    def test_should_expand_the_arguments_of_a_macro_named_by_another(self):
+        self.assertSameOutput("#define f(x) (x)\n"
+                              "#define h f\n"
+                              "h(f(2))\n")
+
+    def test_should_never_expand_a_name_met_inside_its_own_expansion(self):
+        self.assertSameOutput("#define z z[0]\n"
+                              "#define f(a) f(2 * (a))\n"
+                              "f(f(z)) z\n")
+
+    def test_should_expand_a_name_pasted_from_a_macro_being_expanded(self):
+        self.assertSameOutput("#define CAT(a, b) CAT_(a, b)\n"
+                              "#define CAT_(a, b) a ## b\n"
+                              "#define T_0 1\n"
+                              "#define T_ CAT(T_, 0)\n"
+                              "T_\n")
+
+    def test_should_leave_a_function_like_macro_name_ending_a_line(self):
+        self.assertSameOutput("#define F(x) x\n"
+                              "a F\n"
+                              "F(b)\n")
+
+    def test_should_evaluate_not_equal_in_conditionals(self):
+        self.assertSameOutput("#define X 2\n"
+                              "#if X != 3\nyes\n#else\nno\n#endif\n"
+                              "#if X != 2\nno\n#else\nyes\n#endif\n")
+
+    def test_should_evaluate_undefined_identifiers_to_zero(self):
+        self.assertSameOutput("#if UNDEFINED\nno\n#elif UNDEFINED == 0\n"
+                              "yes\n#endif\n")
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,48 @@
+"""Test module for compile.py."""
+
+import io
+import unittest
+from contextlib import redirect_stderr
+from nstl import compile
+from nstl.passes import codegen
+
+
+class CompilerArgumentsTest(unittest.TestCase):
+    """Test class for the command line of the compiler."""
+
+    def setUp(self):
+        self.compiler = compile.Compiler()
+
+    def assertRejected(self, argv):
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            self.compiler.compile(argv)
+
+    def test_should_default_to_the_max_depth_of_the_environment(self):
+        args = self.compiler.args.parse_args(["input.nstl"])
+        self.assertEqual(codegen.NstlDefaultEnv['max_depth'], args.max_depth)
+
+    def test_should_find_the_max_depth_from_the_program_when_asked_to(self):
+        args = self.compiler.args.parse_args(["--max-depth", "auto",
+                                                            "input.nstl"])
+        self.assertEqual('auto', args.max_depth)
+
+    def test_should_reject_fewer_than_one_depth_package_or_job(self):
+        for option in ("--max-depth", "--max-package", "--jobs", "-j"):
+            for value in ("0", "-1", "many"):
+                self.assertRejected([option, value, "input.nstl"])
+
+    def test_should_reject_an_automatic_max_depth_with_an_interface(self):
+        self.assertRejected(["--max-depth", "auto", "--emit-interface",
+                             "lib.nstli", "input.nstl"])
+
+    def test_should_generate_every_depth_unless_asked_to_prune(self):
+        args = self.compiler.args.parse_args(["input.nstl"])
+        self.assertFalse(args.prune_depths)
+
+    def test_should_reject_pruning_the_depths_with_an_interface(self):
+        self.assertRejected(["--prune-depths", "--emit-interface",
+                             "lib.nstli", "input.nstl"])
+
+
+if __name__ == "__main__":
+    pass
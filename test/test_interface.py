@@ -0,0 +1,132 @@
+"""Test module for interface.py."""
+
+import io
+import os
+import unittest
+import tempfile
+from nstl import ast, compile, interface, parse
+from nstl.passes import nameresolve, passmanager
+
+
+LIBRARY = """
+namespace lib {
+    template leaf (T, F(x) = {% (x) %}) { {% leaf %} }
+    namespace detail {
+        template middle (T) { import leaf  nest leaf with T = {% long %} }
+    }
+}
+namespace lib {
+    template top (T) { nest detail.middle }
+}
+"""
+
+CLIENT = """
+namespace client {
+    template user (T) { import lib.leaf  nest lib.top }
+}
+"""
+
+
+def collect(source):
+    context = passmanager.Context()
+    nameresolve.NameCollector().visit(parse.NstlParser().parse(source),
+                                                                    context)
+    return context.resolution
+
+
+def declarations(node):
+    """Return the namespaces and templates declared in a program or a
+    namespace, in pre-order.
+    """
+    decls = [ ]
+    for decl in node.decls:
+        decls.append(decl)
+        if isinstance(decl, ast.Namespace):
+            decls.extend(declarations(decl))
+    return decls
+
+
+class InterfaceTest(unittest.TestCase):
+    """Test class for the interface of a library, written and loaded back."""
+
+    def setUp(self):
+        self.resolution = collect(LIBRARY)
+        file = io.BytesIO()
+        interface.dump(self.resolution, file)
+        file.seek(0)
+        self.loaded = interface.load(file)
+
+    def test_should_mark_every_declaration_as_external(self):
+        decls = declarations(self.loaded)
+        self.assertEqual(5, len(decls))
+        for decl in decls:
+            self.assertTrue(decl.a.external)
+
+    def test_should_strip_the_bodies_of_the_templates(self):
+        templates = [decl for decl in declarations(self.loaded)
+                                    if isinstance(decl, ast.Template)]
+        self.assertEqual(["leaf", "middle", "top"],
+                         [template.name.value for template in templates])
+        for template in templates:
+            self.assertIsNone(template.body)
+
+    def test_should_keep_the_parameters_of_the_templates(self):
+        leaf = declarations(self.loaded)[1]
+        self.assertEqual(["T", "F"], [param.name.value
+                                                for param in leaf.params])
+        self.assertEqual(("x",), leaf.params[1].name.params)
+        self.assertEqual("(x)", leaf.params[1].default.value.strip())
+
+    def test_should_declare_a_reopened_namespace_once(self):
+        self.assertEqual(["lib"], [decl.name.value
+                                            for decl in self.loaded.decls])
+
+    def test_should_resolve_the_names_of_a_client(self):
+        program = nameresolve.merge_asts(self.loaded,
+                                         parse.NstlParser().parse(CLIENT))
+        context = passmanager.Context()
+        nameresolve.NameResolver().visit(program, context)
+        self.assertIn("client.user", context.resolution.index)
+        self.assertIn("lib.detail.middle", context.resolution.index)
+
+
+class CompilerInterfaceTest(unittest.TestCase):
+    """Test class for a client compiled against the interface of a library,
+    which must be generated like the client compiled with the library.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        for name, source in (("lib.nstl", LIBRARY), ("client.nstl", CLIENT)):
+            with open(self.path(name), 'w') as file:
+                file.write(source)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def compile(self, output, *argv):
+        compile.Compiler().compile(list(argv) + ["-f", "-o", self.path(output)])
+        files = { }
+        for path, directories, filenames in os.walk(self.path(output)):
+            for filename in filenames:
+                with open(os.path.join(path, filename)) as file:
+                    files[os.path.relpath(file.name,
+                                          self.path(output))] = file.read()
+        return files
+
+    def test_should_generate_a_client_like_with_the_library(self):
+        together = self.compile("together", self.path("lib.nstl"),
+                                            self.path("client.nstl"))
+        self.compile("lib", "--emit-interface", self.path("lib.nstli"),
+                                                    self.path("lib.nstl"))
+        client = self.compile("client", "-I", self.path("lib.nstli"),
+                                                self.path("client.nstl"))
+        self.assertTrue(client)
+        self.assertEqual({name: text for name, text in together.items()
+                            if name.startswith("client" + os.sep)}, client)
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,69 @@
+"""Test module for lex.py."""
+
+import unittest
+from nstl import lex
+from nstl.ply.lex import NullLogger
+
+
+SOURCE = """namespace ns {
+    template t (T)
+    {
+        import u
+        {% if (x) { /* } */ } %}
+        // }
+        /* { */
+    }
+    template u (T) { }
+}
+"""
+
+
+def tokens(text, lazybodies=False):
+    lexer = lex.NstlLexer(lazybodies)
+    lexer.build(optimize=False, errorlog=NullLogger())
+    lexer.input(text)
+    return list(iter(lexer.token, None))
+
+
+class LexerTest(unittest.TestCase):
+    """Test class for the lexing of template bodies."""
+
+    def test_should_lex_each_body_as_a_single_token_when_lazy(self):
+        types = [tok.type for tok in tokens(SOURCE, lazybodies=True)]
+        self.assertEqual(2, types.count('tBODY'))
+        self.assertNotIn('tIMPORT', types)
+        self.assertEqual(['tRBRACE'], types[-1:])
+
+    def test_should_span_the_body_up_to_its_closing_brace(self):
+        body = [tok for tok in tokens(SOURCE, lazybodies=True)
+                                            if tok.type == 'tBODY'][0]
+        text = body.value.text()
+        self.assertTrue(text.startswith("{\n        import u"))
+        self.assertTrue(text.endswith("/* { */\n    }"))
+        self.assertEqual(3, body.value.lineno)
+
+    def test_should_lex_the_same_tokens_inside_of_the_body(self):
+        lazy = [ ]
+        for tok in tokens(SOURCE, lazybodies=True):
+            if tok.type == 'tBODY':
+                lazy.extend(tokens(tok.value.text()))
+            else:
+                lazy.append(tok)
+        self.assertEqual([(tok.type, tok.value) for tok in tokens(SOURCE)],
+                         [(tok.type, tok.value) for tok in lazy])
+
+    def test_should_count_the_lines_of_the_skipped_bodies(self):
+        last = tokens(SOURCE, lazybodies=True)[-1]
+        self.assertEqual(tokens(SOURCE)[-1].lineno, last.lineno)
+
+    def test_should_not_skip_the_braces_of_namespaces(self):
+        types = [tok.type for tok in tokens("namespace ns { }", True)]
+        self.assertEqual(['tNAMESPACE', 'tID', 'tLBRACE', 'tRBRACE'], types)
+
+    def test_should_reject_an_unterminated_body(self):
+        with self.assertRaises(lex.LexError):
+            lex.skip_body("{ {% } %}", 0)
+
+
+if __name__ == "__main__":
+    pass
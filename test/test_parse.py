@@ -0,0 +1,97 @@
+"""Test module for parse.py."""
+
+import os
+import unittest
+import tempfile
+from collections import OrderedDict
+from nstl import ast, parse, stats
+from nstl.passes import nameresolve, passmanager
+
+
+SOURCE = """
+namespace ns {
+    template t (T)
+    {
+        {% T_ x; %}
+    }
+    template u (T)
+    {
+        import t
+        nest t with T = {% int %}
+        {% T_ y; %}
+    }
+}
+"""
+
+
+def is_parsed(template):
+    """Return whether the body of a template was parsed."""
+    return not isinstance(OrderedDict.__getitem__(template.c, 'body'),
+                                                                ast.Lazy)
+
+
+class LazyBodiesTest(unittest.TestCase):
+    """Test class for the template bodies parsed on first access."""
+
+    def setUp(self):
+        self.program = parse.NstlParser().parse(SOURCE)
+        self.templates = list(self.program.decls[0].decls)
+
+    def test_should_leave_an_unparsed_body_out_of_the_children(self):
+        t, u = self.templates
+        self.assertEqual(['name', 'params'], [name for name, child
+                                                        in t.children()])
+        self.assertFalse(is_parsed(t))
+        u.body
+        self.assertEqual(['name', 'params', 'body'], [name for name, child
+                                                        in u.children()])
+
+    def test_should_count_the_nodes_without_parsing_the_bodies(self):
+        stats.Statistics().count_nodes(self.program)
+        self.assertFalse(any(map(is_parsed, self.templates)))
+
+    def test_should_resolve_a_body_once_it_is_parsed(self):
+        context = passmanager.Context()
+        nameresolve.NameResolver().visit(self.program, context)
+        self.assertFalse(any(map(is_parsed, self.templates)))
+        t, u = self.templates
+        ref = u.body.stmnts[0].refs[0]
+        self.assertIs(t, context.resolution.resolved[ref])
+
+    def test_should_not_write_the_tables_of_the_body_parser(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+        parse.NstlParser(yacctab='_test_yacctab')
+        self.assertNotIn('_test_yacctab_body.py', os.listdir(os.curdir))
+
+
+class LeafTableTest(unittest.TestCase):
+    """Test class for the leaf nodes shared by the parser."""
+
+    def setUp(self):
+        self.parser = parse.NstlParser()
+
+    def test_should_share_the_leaves_of_a_program(self):
+        program = self.parser.parse(SOURCE)
+        t, u = program.decls[0].decls
+        self.assertIs(t.params[0].name, u.params[0].name)
+
+    def test_should_not_share_the_leaves_of_different_programs(self):
+        first = self.parser.parse(SOURCE)
+        size = len(self.parser.leaves)
+        second = self.parser.parse(SOURCE)
+        self.assertEqual(size, len(self.parser.leaves))
+        self.assertIsNot(first.decls[0].decls[0].params[0].name,
+                         second.decls[0].decls[0].params[0].name)
+
+    def test_should_share_the_leaves_of_a_body_parsed_later(self):
+        program = self.parser.parse(SOURCE)
+        self.parser.parse(SOURCE)
+        t, u = program.decls[0].decls
+        self.assertIs(u.params[0].name, u.body.stmnts[1].args[0].name)
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,135 @@
+"""Test module for serialize.py."""
+
+import unittest
+from collections import OrderedDict
+from nstl import ast, parse, serialize
+from nstl.passes import nameresolve, passmanager
+
+
+SOURCE = """
+namespace lib {
+    namespace iterator {
+        template next (FuncName(func))
+        {
+            {% next %}
+        }
+    }
+
+    namespace list {
+        namespace iterator {
+            template begin (FuncName(func))
+            {
+                import next
+                {% begin %}
+            }
+        }
+
+        template front (FuncName(func))
+        {
+            import iterator.begin
+            nest lib.iterator.next
+            {% front %}
+        }
+    }
+}
+"""
+
+
+def collect(program):
+    context = passmanager.Context()
+    nameresolve.NameCollector().visit(program, context)
+    return context.resolution
+
+
+def resolve(program):
+    context = passmanager.Context()
+    program = nameresolve.NameResolver().visit(program, context)
+    return program, context.resolution
+
+
+def is_decoded(template):
+    """Return whether the body of a template was decoded or parsed."""
+    return not isinstance(OrderedDict.__getitem__(template.c, 'body'),
+                                                                ast.Lazy)
+
+
+def references(index, resolved):
+    """Return the fully qualified names of the templates referred to by the
+    statements of each template of an index.
+    """
+    qualnames = nameresolve.canonical_names(index)
+    found = { }
+    for qualname, decl in index.items():
+        if not isinstance(decl, ast.Template) or qualname in found:
+            continue
+        found[qualname] = [ ]
+        for stmnt in decl.body.stmnts:
+            if isinstance(stmnt, ast.ImportStatement):
+                refs = stmnt.refs
+            elif isinstance(stmnt, ast.NestStatement):
+                refs = [stmnt.ref]
+            else:
+                continue
+            found[qualname].extend(qualnames[id(resolved[ref])] for ref in refs)
+    return found
+
+
+class SerializeTest(unittest.TestCase):
+    """Test class for the round trip of a resolved program."""
+
+    def setUp(self):
+        self.program, self.resolution = resolve(
+                                        parse.NstlParser().parse(SOURCE))
+        self.data = serialize.dumps(self.program, self.resolution.resolved)
+        self.references = references(self.resolution.index,
+                                     self.resolution.resolved)
+
+    def test_should_start_with_the_magic_and_version(self):
+        self.assertTrue(self.data.startswith(serialize.MAGIC))
+        self.assertEqual(serialize.VERSION, self.data[len(serialize.MAGIC)])
+
+    def test_should_not_decode_bodies_when_loaded_lazily(self):
+        resolution = collect(serialize.loads(self.data, resolved={ }))
+        templates = [decl for decl in resolution.index.values()
+                                        if isinstance(decl, ast.Template)]
+        self.assertEqual(3, len(set(templates)))
+        self.assertFalse(any(is_decoded(template) for template in templates))
+
+    def test_should_decode_bodies_when_loaded_eagerly(self):
+        resolution = collect(serialize.loads(self.data, False))
+        self.assertTrue(all(is_decoded(decl)
+                for decl in resolution.index.values()
+                                        if isinstance(decl, ast.Template)))
+
+    def test_should_keep_the_namespace_reopened_from_a_nested_scope_shared(self):
+        loaded = serialize.loads(self.data)
+        iterator, list_ = loaded.decls[0].decls
+        self.assertIs(iterator, list_.decls[0])
+
+    def test_should_keep_the_resolved_references(self):
+        for lazy in (True, False):
+            resolved = { }
+            resolution = collect(serialize.loads(self.data, lazy, resolved))
+            self.assertEqual(self.references,
+                             references(resolution.index, resolved))
+
+    def test_should_collect_and_resolve_the_loaded_program_again(self):
+        for lazy in (True, False):
+            loaded, resolution = resolve(serialize.loads(self.data, lazy))
+            self.assertEqual(sorted(self.resolution.index),
+                             sorted(resolution.index))
+            self.assertEqual(self.references,
+                             references(resolution.index, resolution.resolved))
+
+    def test_should_give_the_same_bytes_when_serialized_again(self):
+        resolved = { }
+        loaded = serialize.loads(self.data, resolved=resolved)
+        self.assertEqual(self.data, serialize.dumps(loaded, resolved))
+
+    def test_should_reject_data_that_is_not_serialized(self):
+        with self.assertRaises(serialize.SerializationError):
+            serialize.loads(b'not an nstl tree')
+
+
+if __name__ == "__main__":
+    pass